@@ -1,16 +1,38 @@
-from fastapi import FastAPI, Request
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse
 import uvicorn
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+
+# The server only reads the keyword and near-duplicate indexes; ingestion scripts save them
+os.environ.setdefault("WOLFARE_INDEX_WRITER", "0")
 
 import get_latest_news_script
 import main_chatbot
+from services.chat import solar_hn, PIPELINE_PROFILES, DEFAULT_PROFILE, TIME_WINDOW_DAYS
+from services.streaming import format_sse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # News is scraped and summarized in the background so startup and /api/news never wait on it
+    get_latest_news_script.news_refresher.start()
+    yield
+    get_latest_news_script.news_refresher.stop(timeout=5)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 class Message(BaseModel):
     content: str
+    profile: Optional[str] = None  # fast, balanced or audited
+    time_window_days: Optional[int] = None  # only retrieve documents from the last N days (e.g. 7, 30, 90); 0 disables the window
+
+def resolveProfile(message: Message) -> str:
+    profile = message.profile or DEFAULT_PROFILE
+    if profile not in PIPELINE_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{profile}', expected one of {list(PIPELINE_PROFILES)}")
+    return profile
 
 class Metadata(BaseModel):
     article_id: str
@@ -32,22 +54,45 @@ async def root():
     return {"message": "API server is working"}
 
 @app.get("/api/news")
-async def getNews():    
-    temp_update = datetime.now().strftime("%d-%m-%Y")
-    lastest_update, output = get_latest_news_script.getLastestWithDate(temp_update)
-    return {"date" : lastest_update, "output" : output}
+async def getNews():
+    return get_latest_news_script.getLatestSnapshot()
 
 @app.post("/api/prompt")
 async def promptReq(message: Message):
     prompt = message.content
+    profile = resolveProfile(message)
     print(prompt)
-    e, output, confident = main_chatbot.main(prompt)
+    time_window_days = TIME_WINDOW_DAYS if message.time_window_days is None else message.time_window_days
+    e, output, confident, request_id = await main_chatbot.amain(prompt, profile, time_window_days)
     if e != "":
         output = e
     else:
         output = output + "\n" + confident
+    if request_id:
+        return {"output" : output, "request_id" : request_id}
     return {"output" : output}
 
+@app.post("/api/prompt/stream")
+async def promptStreamReq(message: Message):
+    profile = resolveProfile(message)
+    time_window_days = TIME_WINDOW_DAYS if message.time_window_days is None else message.time_window_days
+    async def events():
+        async for event in main_chatbot.astream(message.content, profile, time_window_days):
+            yield format_sse(event["event"], event["data"])
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/api/evaluation/{request_id}")
+async def evaluationReq(request_id: str):
+    evaluation = solar_hn.get_evaluation(request_id)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="Unknown request id")
+    return {"request_id" : request_id, **evaluation}
+
+@app.get("/api/cache/stats")
+async def cacheStatsReq():
+    # Counting the stored embeddings reads SQLite, so it runs off the event loop
+    return {"responses" : solar_hn.response_cache.stats(), "embeddings" : await solar_hn.run_sync(solar_hn.embedding_cache.stats)}
+
 @app.post("/api/add_data")
 async def addDataReq(message: Message):
     output = f"This is our future plan"
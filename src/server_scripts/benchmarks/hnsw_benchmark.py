@@ -0,0 +1,192 @@
+"""
+Recall and latency benchmark for Chroma HNSW settings and the NumPy backend.
+
+Builds one collection per (space, M, construction_ef, search_ef) combination over the same
+embedding set, then measures recall@k against exact NumPy search plus p50/p99 latency of
+single-vector queries. Embeddings are synthetic clustered vectors by default, or a recorded
+set from a .npy file or an existing Chroma directory. With --numpy-dtypes the same queries also
+run against NumpyCollection (exact search over float16/int8 storage) for a quality comparison.
+
+    python benchmarks/hnsw_benchmark.py --count 100000 --dim 1024 --m 16 32 --search-ef 10 50 100
+    python benchmarks/hnsw_benchmark.py --chroma-path ../data/chroma_db --collection hacker_news_stories
+    python benchmarks/hnsw_benchmark.py --numpy-dtypes float16 int8
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, Any, List, Tuple
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.numpy_store import NumpyCollection
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_embeddings(count: int, dim: int, n_queries: int, clusters: int = 64, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Clustered Gaussian vectors, which are closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    spread = 0.35 * np.sqrt(dim / 2)
+
+    def draw(n):
+        points = centers[rng.integers(0, clusters, n)] + rng.standard_normal((n, dim)).astype(np.float32) * spread / np.sqrt(dim)
+        return points.astype(np.float32)
+
+    return draw(count), draw(n_queries)
+
+
+def recorded_embeddings(data: np.ndarray, n_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Hold out n_queries stored vectors as queries and search the rest."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(data))
+    return data[order[n_queries:]], data[order[:n_queries]]
+
+
+def load_chroma_embeddings(path: str, name: str, page_size: int = 5000) -> np.ndarray:
+    collection = chromadb.PersistentClient(path=path).get_collection(name=name)
+    pages, offset = [], 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=['embeddings'])
+        if not page['ids']:
+            break
+        pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+    return np.concatenate(pages) if pages else np.empty((0, 0), dtype=np.float32)
+
+
+def exact_neighbors(data: np.ndarray, queries: np.ndarray, k: int, space: str, chunk: int = 256) -> np.ndarray:
+    """Brute-force top-k ids per query under the same distance Chroma uses for `space`."""
+    if space == "cosine":
+        data = data / np.maximum(np.linalg.norm(data, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    squared_norms = (data ** 2).sum(axis=1) if space == "l2" else None
+    neighbors = []
+    for start in range(0, len(queries), chunk):
+        block = queries[start:start + chunk] @ data.T
+        # For l2 the query norm is constant per row, so ||d||^2 - 2 q.d ranks like the distance
+        scores = squared_norms - 2 * block if space == "l2" else -block
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        rows = np.arange(len(top))[:, None]
+        neighbors.append(top[rows, np.argsort(scores[rows, top], axis=1)])
+    return np.concatenate(neighbors)
+
+
+def build_collection(client, data: np.ndarray, metadata: Dict[str, Any]):
+    collection = client.create_collection(name=f"bench-{uuid.uuid4().hex[:12]}", metadata=metadata)
+    batch_size = client.max_batch_size if hasattr(client, "max_batch_size") else 5000
+    for start in range(0, len(data), batch_size):
+        collection.add(
+            ids=[str(i) for i in range(start, min(start + batch_size, len(data)))],
+            embeddings=data[start:start + batch_size].tolist()
+        )
+    return collection
+
+
+def run_configuration(client, data, queries, truth, k, space, m, construction_ef, search_ef) -> Dict[str, Any]:
+    metadata = {"hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+    started = time.perf_counter()
+    collection = build_collection(client, data, metadata)
+    build_seconds = time.perf_counter() - started
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(int(i) for i in result['ids'][0]) & set(expected.tolist()))
+    client.delete_collection(name=collection.name)
+    return {
+        "space": space, "M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+        f"recall@{k}": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "build_seconds": build_seconds
+    }
+
+
+def run_numpy(data, queries, truth, k, space, dtype) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        collection = NumpyCollection(directory, dtype=dtype, space=space)
+        for start in range(0, len(data), 5000):
+            collection.upsert([str(i) for i in range(start, min(start + 5000, len(data)))], data[start:start + 5000])
+        build_seconds = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = collection.query([query], n_results=k, include=[])
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(int(i) for i in result['ids'][0]) & set(expected.tolist()))
+        storage_bytes = collection.storage_bytes()
+    return {
+        "space": space, "backend": f"numpy-{dtype}",
+        f"recall@{k}": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "build_seconds": build_seconds,
+        "storage_mb": storage_bytes / 2 ** 20,
+        "float64_mb": data.shape[0] * data.shape[1] * 8 / 2 ** 20
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000, help="synthetic vectors to index")
+    parser.add_argument("--dim", type=int, default=256, help="synthetic vector dimension (Solar embeddings are 4096)")
+    parser.add_argument("--embeddings", help="recorded embeddings as an (n, dim) .npy file")
+    parser.add_argument("--chroma-path", help="read recorded embeddings from this Chroma directory")
+    parser.add_argument("--collection", default="hacker_news_stories")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", nargs="+", default=["cosine"], choices=["cosine", "l2", "ip"])
+    parser.add_argument("--m", nargs="+", type=int, default=[16])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 50, 100])
+    parser.add_argument("--numpy-dtypes", nargs="*", default=[], choices=["float16", "int8"],
+                        help="also benchmark the NumPy backend with these storage types")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.embeddings:
+        data, queries = recorded_embeddings(np.load(args.embeddings).astype(np.float32), args.queries)
+    elif args.chroma_path:
+        data, queries = recorded_embeddings(load_chroma_embeddings(args.chroma_path, args.collection), args.queries)
+    else:
+        data, queries = synthetic_embeddings(args.count, args.dim, args.queries)
+    print(f"{len(data)} vectors of dimension {data.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    client = chromadb.EphemeralClient()
+    results = []
+    for space in args.space:
+        truth = exact_neighbors(data, queries, args.k, space)
+        for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+            row = run_configuration(client, data, queries, truth, args.k, space, m, construction_ef, search_ef)
+            results.append(row)
+            print(f"space={space:<6} M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+                  f"recall@{args.k}={row[f'recall@{args.k}']:.3f} p50={row['p50_ms']:.2f}ms "
+                  f"p99={row['p99_ms']:.2f}ms build={row['build_seconds']:.1f}s")
+        for dtype in args.numpy_dtypes:
+            row = run_numpy(data, queries, truth, args.k, space, dtype)
+            results.append(row)
+            print(f"space={space:<6} numpy-{dtype:<7} recall@{args.k}={row[f'recall@{args.k}']:.3f} "
+                  f"p50={row['p50_ms']:.2f}ms p99={row['p99_ms']:.2f}ms build={row['build_seconds']:.1f}s "
+                  f"storage={row['storage_mb']:.1f}MB (float64: {row['float64_mb']:.1f}MB)")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
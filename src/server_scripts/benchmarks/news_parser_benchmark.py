@@ -0,0 +1,234 @@
+"""
+Throughput and memory benchmark for the news extractors, replayed over saved HTML.
+
+Every fixture page is parsed by its source's extractor with each available parser, once over
+the whole page and once restricted to the elements the extractor reads, reporting pages/sec
+and the peak traced memory per page. Every result is compared with the html.parser full-page
+result, and any difference or extraction error is listed and makes the run exit non-zero, so
+the same run checks a parser switch and doubles as a check after a site changes its markup.
+Fixtures are generated synthetic pages by default; --record saves the live pages once for
+offline replay with --fixtures.
+
+    python benchmarks/news_parser_benchmark.py
+    python benchmarks/news_parser_benchmark.py --record ../data/news_fixtures --articles 10
+    python benchmarks/news_parser_benchmark.py --fixtures ../data/news_fixtures --repeat 5
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Any, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.news_extractors import SOURCES
+from utils.http_client import PooledHTTPClient
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.html"
+
+
+def _noise(rng: random.Random, blocks: int) -> str:
+    """Navigation, scripts and widgets that surround the article on the real sites."""
+    parts = []
+    for i in range(blocks):
+        links = "".join(f'<li class="menu-item"><a href="/topic/{i}-{j}">Topic {j}</a></li>' for j in range(12))
+        parts.append(f'<nav class="menu-{i}"><ul>{links}</ul></nav>')
+        parts.append(f'<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{"slot": {i}, "r": {rng.random()}}});</script>')
+        parts.append(f'<div class="widget"><div class="ad-slot" data-id="{i}"><span>Advertisement</span></div>'
+                     f'<img src="/img/{i}.png" alt="banner {i}"></div>')
+    return "".join(parts)
+
+
+def _paragraphs(rng: random.Random, count: int) -> List[str]:
+    words = ["ransomware", "patch", "vulnerability", "exploit", "attackers", "CVE-2026-1234", "botnet",
+             "phishing", "researchers", "malware", "the", "a", "of", "in", "was", "update", "servers"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(20, 60))) + "." for _ in range(count)]
+
+
+def synthetic_fixtures(directory: str, articles: int = 10, noise: int = 40, seed: int = 0) -> str:
+    """Write index and article pages shaped like each source's markup into `directory`."""
+    rng = random.Random(seed)
+    pages = {"thehackernews": {}, "darkreading": {}, "securityaffairs": {}}
+    for i in range(articles):
+        body = _paragraphs(rng, rng.randint(8, 20))
+        pages["thehackernews"][f"article-{i}.html"] = (
+            f'<html><head><title>THN</title></head><body>{_noise(rng, noise)}'
+            f'<h1 class="story-title">The Hacker News story {i}</h1><div class="postmeta"><span class="author">Oct {i % 28 + 1:02d}, 2026</span></div>'
+            f'<div class="articlebody">' + "".join(f"<p>{text}</p>" if k % 5 else f"<h2>Section {k}</h2><p>{text}</p>" for k, text in enumerate(body))
+            + '<p><em>Found this article interesting? Follow us.</em></p></div>'
+            + "".join(f'<p class="footer-{k}">Footer {k}</p>' for k in range(8)) + f'{_noise(rng, noise // 4)}</body></html>'
+        )
+        pages["darkreading"][f"article-{i}.html"] = (
+            f'<html><head><title>DR</title></head><body>{_noise(rng, noise)}'
+            f'<h1 class="ArticleBase-LargeTitle">Dark Reading story {i}</h1><p>Author Name</p><p>October {i % 28 + 1}, 2026</p>'
+            + "".join(f"<p>{text}</p>" for text in body) + '<h2>About the Author</h2><p>Bio</p><p>Read more about:</p>'
+            + f'{_noise(rng, noise // 4)}</body></html>'
+        )
+        pages["securityaffairs"][f"article-{i}.html"] = (
+            f'<html><head><title>SA</title></head><body>{_noise(rng, noise)}'
+            f'<div class="post-time mb-3"><span>Pierluigi</span><span> October {i % 28 + 1:02d}, 2026</span></div>'
+            f'<div class="article-details-block wow fadeInUp"><p>Security Affairs story {i}</p>'
+            + "".join(f"<p>{text}</p>" for text in body)
+            + '<p>Follow me on Twitter: @securityaffairs and Facebook and Mastodon</p><p>Pierluigi Paganini</p></div>'
+            + f'{_noise(rng, noise // 4)}</body></html>'
+        )
+    pages["thehackernews"][INDEX_FILE] = "<html><body>" + _noise(rng, noise) + "".join(
+        f'<div class="body-post clear"><a class="story-link" href="https://thehackernews.com/{i}.html"><h2>Story {i}</h2></a></div>'
+        for i in range(articles)) + "</body></html>"
+    pages["darkreading"][INDEX_FILE] = "<html><body>" + _noise(rng, noise) + "".join(
+        f'<div class="ContentPreview LatestFeatured-ContentItem LatestFeatured-ContentItem_left">'
+        f'<a class="ListPreview-Title" href="/story-{i}">Story {i}</a></div>' for i in range(articles)) + "</body></html>"
+    pages["securityaffairs"][INDEX_FILE] = "<html><body>" + _noise(rng, noise) + "".join(
+        f'<div class="news-card news-card-category mb-3 mb-lg-5"><a href="https://securityaffairs.com/{i}.html">Story {i}</a></div>'
+        for i in range(articles)) + "</body></html>"
+
+    for source, files in pages.items():
+        os.makedirs(os.path.join(directory, source), exist_ok=True)
+        for name, html in files.items():
+            with open(os.path.join(directory, source, name), 'w', encoding='utf-8') as file:
+                file.write(html)
+    return directory
+
+
+def record_fixtures(directory: str, articles: int) -> str:
+    """Save each source's index page and up to `articles` of its articles, named by position."""
+    client = PooledHTTPClient()
+    for source, (url, links, _) in SOURCES.items():
+        os.makedirs(os.path.join(directory, source), exist_ok=True)
+        try:
+            index = client.get(url).text
+        except Exception as e:
+            logger.error(f"Could not record {source}: {e}")
+            continue
+        with open(os.path.join(directory, source, INDEX_FILE), 'w', encoding='utf-8') as file:
+            file.write(index)
+        for i, href in enumerate(links(index)[:articles]):
+            try:
+                html = client.get(href).text
+            except Exception as e:
+                logger.error(f"Could not record {href}: {e}")
+                continue
+            with open(os.path.join(directory, source, f"article-{i}.html"), 'w', encoding='utf-8') as file:
+                file.write(html)
+        print(f"recorded {source}")
+    return directory
+
+
+def load_fixtures(directory: str) -> Dict[str, Dict[str, str]]:
+    fixtures = {}
+    for source in SOURCES:
+        folder = os.path.join(directory, source)
+        if not os.path.isdir(folder):
+            continue
+        fixtures[source] = {}
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".html"):
+                with open(os.path.join(folder, name), encoding='utf-8') as file:
+                    fixtures[source][name] = file.read()
+    return fixtures
+
+
+def extract(source: str, name: str, html: str, restricted: bool, parser: str):
+    _, links, article = SOURCES[source]
+    if name == INDEX_FILE:
+        return links(html, restricted=restricted, parser=parser)
+    return article(f"fixture://{source}/{name}", html, restricted=restricted, parser=parser)
+
+
+def run_extractor(source: str, pages: Dict[str, str], restricted: bool, parser: str, repeat: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Time `repeat` passes over the pages, then measure peak memory in one traced pass."""
+    outputs = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, html in pages.items():
+            try:
+                outputs[name] = extract(source, name, html, restricted, parser)
+            except Exception as e:
+                outputs[name] = f"error: {type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    for name, html in pages.items():
+        tracemalloc.start()
+        try:
+            extract(source, name, html, restricted, parser)
+        except Exception:
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    parsed = repeat * len(pages)
+    row = {
+        "source": source,
+        "parser": parser,
+        "mode": "restricted" if restricted else "full",
+        "pages": len(pages),
+        "pages_per_second": parsed / elapsed if elapsed > 0 else 0.0,
+        "mean_peak_kb": sum(peaks) / len(peaks) / 1024,
+        "max_peak_kb": max(peaks) / 1024,
+        "input_kb": sum(len(html.encode('utf-8')) for html in pages.values()) / len(pages) / 1024
+    }
+    return row, outputs
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="directory with <source>/index.html and <source>/*.html pages")
+    parser.add_argument("--record", help="download live pages into this directory, then benchmark them")
+    parser.add_argument("--articles", type=int, default=10, help="articles per source to generate or record")
+    parser.add_argument("--noise", type=int, default=40, help="page chrome blocks in synthetic pages (page size)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the fixtures")
+    parser.add_argument("--parsers", nargs="+", default=None,
+                        help="BeautifulSoup tree builders (default: html.parser, plus lxml when installed)")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.record:
+        directory = record_fixtures(args.record, args.articles)
+    elif args.fixtures:
+        directory = args.fixtures
+    else:
+        directory = synthetic_fixtures(tempfile.mkdtemp(prefix="news_fixtures_"), args.articles, args.noise)
+    fixtures = load_fixtures(directory)
+    parsers = args.parsers or ["html.parser"] + (["lxml"] if importlib.util.find_spec("lxml") else [])
+    print(f"fixtures in {directory}: " + ", ".join(f"{source}={len(pages)}" for source, pages in fixtures.items()))
+
+    results, problems = [], []
+    for source, pages in fixtures.items():
+        # Every parser and mode must extract what html.parser extracts from the whole page
+        _, reference = run_extractor(source, pages, False, "html.parser", 1)
+        for tree_builder in parsers:
+            for restricted in (False, True):
+                row, outputs = run_extractor(source, pages, restricted, tree_builder, args.repeat)
+                results.append(row)
+                print(f"{source:<16} {tree_builder:<12} {row['mode']:<10} {row['pages_per_second']:8.1f} pages/s "
+                      f"peak mem {row['mean_peak_kb']:8.0f}KB mean {row['max_peak_kb']:8.0f}KB max "
+                      f"(pages {row['input_kb']:.0f}KB)")
+                for name, output in outputs.items():
+                    if isinstance(output, str) and output.startswith("error: "):
+                        problems.append(f"{source}/{name} [{tree_builder}, {row['mode']}] {output}")
+                    elif output != reference[name]:
+                        problems.append(f"{source}/{name} [{tree_builder}, {row['mode']}] differs from html.parser full-page result")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"results": results, "problems": problems}, file, indent=2)
+    if problems:
+        print(f"{len(problems)} problems:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("every parser and mode matches html.parser full-page extraction on every fixture")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as "cve-2024-3094", "log4j-core" or "2.17.1" whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_SPLIT_PATTERN = re.compile(r"[._\-/]")
+
+# Dropped from queries: in natural-language questions they match most documents and add no signal
+STOP_WORDS = frozenset(
+    "a about above after again against all am an and any are as at be because been before being below "
+    "between both but by can could did do does doing down during each few for from further had has have "
+    "having he her here hers herself him himself his how i if in into is it its itself just me more most "
+    "my myself no nor not now of off on once only or other our ours ourselves out over own same she should "
+    "so some such than that the their theirs them themselves then there these they this those through to "
+    "too under until up very was we were what when where which while who whom why will with would you "
+    "your yours yourself yourselves".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; compound tokens are emitted whole and as their parts."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = _SPLIT_PATTERN.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+
+    Queries drop stop words, and terms found in more than `max_document_fraction` of the
+    documents (IDF close to zero) unless nothing rarer is left, so a natural-language question
+    only walks the postings of its informative terms. Documents are added or replaced incrementally by id. The index lives in memory and is
+    snapshotted to `path` (pickle, atomic replace) at most every `save_interval` seconds
+    during writes and on flush(). A `read_only` index never saves; reload_if_changed() picks up
+    the snapshots of the process that writes it.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75, save_interval: float = 30.0,
+                 max_document_fraction: float = 0.5, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.k1 = k1
+        self.b = b
+        self.max_document_fraction = max_document_fraction
+        self.save_interval = save_interval
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_ids: List[Optional[str]] = []
+        self.doc_index: Dict[str, int] = {}
+        self.doc_lengths: List[int] = []
+        self.doc_terms: List[Tuple[str, ...]] = []
+        self.total_length = 0
+        self.dirty = False
+        self.last_saved = time.monotonic()
+        self.snapshot_mtime = None  # mtime of the snapshot last loaded or saved
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.doc_index)
+
+    def __contains__(self, doc_id) -> bool:
+        return str(doc_id) in self.doc_index
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self.doc_index)
+
+    def _remove(self, index: int):
+        for term in self.doc_terms[index]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(index, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths[index]
+        self.doc_lengths[index] = 0
+        self.doc_terms[index] = ()
+        self.doc_ids[index] = None
+
+    def add_documents(self, ids: Sequence[str], documents: Sequence[str]):
+        """Index documents, replacing any earlier version stored under the same id."""
+        with self._lock:
+            for doc_id, text in zip(ids, documents):
+                doc_id = str(doc_id)
+                if doc_id in self.doc_index:
+                    self._remove(self.doc_index[doc_id])
+                counts = Counter(tokenize(text or ""))
+                index = len(self.doc_ids)
+                self.doc_ids.append(doc_id)
+                self.doc_index[doc_id] = index
+                self.doc_lengths.append(sum(counts.values()))
+                self.doc_terms.append(tuple(counts))
+                self.total_length += self.doc_lengths[index]
+                for term, frequency in counts.items():
+                    self.postings.setdefault(term, {})[index] = frequency
+            self.dirty = True
+            if time.monotonic() - self.last_saved >= self.save_interval:
+                self.save()
+
+    def delete_documents(self, ids: Sequence[str]):
+        with self._lock:
+            for doc_id in ids:
+                index = self.doc_index.pop(str(doc_id), None)
+                if index is not None:
+                    self._remove(index)
+            self.dirty = True
+
+    def _query_terms(self, query: str, document_count: int) -> List[Tuple[str, Dict[int, int]]]:
+        terms = set(tokenize(query))
+        # A query made only of stop words keeps them rather than matching nothing
+        terms = (terms - STOP_WORDS) or terms
+        matched = [(term, self.postings[term]) for term in terms if self.postings.get(term)]
+        informative = [(term, postings) for term, postings in matched
+                       if len(postings) <= self.max_document_fraction * document_count]
+        if informative or not matched:
+            return informative
+        return [min(matched, key=lambda item: len(item[1]))]
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Return up to n_results (id, score) pairs, best first."""
+        with self._lock:
+            document_count = len(self.doc_index)
+            if document_count == 0:
+                return []
+            average_length = self.total_length / document_count or 1.0
+            scores: Dict[int, float] = {}
+            for term, postings in self._query_terms(query, document_count):
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for index, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / average_length)
+                    scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(self.doc_ids[index], score) for index, score in best]
+
+    def save(self):
+        if not self.path or self.read_only:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._compact()
+            state = {
+                "k1": self.k1, "b": self.b,
+                "postings": self.postings, "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths, "doc_terms": self.doc_terms
+            }
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'wb') as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+            self.snapshot_mtime = os.stat(self.path).st_mtime_ns
+            self.dirty = False
+            self.last_saved = time.monotonic()
+
+    def flush(self):
+        if self.dirty:
+            self.save()
+
+    def reload_if_changed(self):
+        """Load the snapshot again if another process saved a newer one."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError):
+            return
+        if mtime != self.snapshot_mtime:
+            self.load()
+
+    def load(self):
+        # Unpickled before taking the lock, so searches keep running on the old state meanwhile
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'rb') as file:
+                state = pickle.load(file)
+        except Exception as e:
+            logger.error(f"Could not load keyword index from {self.path}: {e}")
+            return
+        with self._lock:
+            self.snapshot_mtime = mtime
+            self.postings = state["postings"]
+            self.doc_ids = state["doc_ids"]
+            self.doc_lengths = state["doc_lengths"]
+            self.doc_terms = state["doc_terms"]
+            self.doc_index = {doc_id: index for index, doc_id in enumerate(self.doc_ids) if doc_id is not None}
+            self.total_length = sum(self.doc_lengths)
+
+    def _compact(self):
+        # Replaced documents leave holes; renumber once they make up a quarter of the slots
+        holes = len(self.doc_ids) - len(self.doc_index)
+        if holes == 0 or holes * 4 < len(self.doc_ids):
+            return
+        remap = {}
+        doc_ids, doc_lengths, doc_terms = [], [], []
+        for old, doc_id in enumerate(self.doc_ids):
+            if doc_id is None:
+                continue
+            remap[old] = len(doc_ids)
+            doc_ids.append(doc_id)
+            doc_lengths.append(self.doc_lengths[old])
+            doc_terms.append(self.doc_terms[old])
+        self.postings = {term: {remap[old]: tf for old, tf in postings.items()} for term, postings in self.postings.items()}
+        self.doc_ids, self.doc_lengths, self.doc_terms = doc_ids, doc_lengths, doc_terms
+        self.doc_index = {doc_id: index for index, doc_id in enumerate(doc_ids)}
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging
+from typing import Dict, Any, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys written by plan_writes(); they are not part of the hashed content
+HASH_KEYS = ("content_hash", "record_hash")
+# Plan states that are embedded and written; "unchanged" and "duplicate" items are skipped
+WRITE_STATES = ("new", "updated")
+
+
+def content_hash(text: str) -> str:
+    """Digest of the document text alone; equal texts share an embedding."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def record_hash(text: str, metadata: Dict[str, Any]) -> str:
+    """Digest of text and metadata; when it is unchanged the stored record needs no write."""
+    fields = {key: value for key, value in metadata.items() if key not in HASH_KEYS}
+    payload = json.dumps([text or "", fields], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def plan_writes(collection, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]], texts: Sequence[str]) -> Dict[str, Any]:
+    """
+    Compare a batch against what the collection already stores.
+
+    Each item is "unchanged" (same id and record hash: skip it), "updated" (the id exists with
+    other content) or "new". Changed items whose text is already stored, under their own id or
+    another one, reuse that embedding instead of calling the embedding API again.
+    Hashes are added to the returned metadatas so the next run can compare against them.
+
+    :return: {"status": [...], "metadatas": [...], "reuse": {index: embedding}}
+    """
+    metadatas = [dict(metadata, content_hash=content_hash(text), record_hash=record_hash(text, metadata))
+                 for metadata, text in zip(metadatas, texts)]
+    stored = collection.get(ids=list(ids), include=['metadatas'])
+    stored_hashes = {doc_id: (metadata or {}) for doc_id, metadata in zip(stored['ids'], stored['metadatas'])}
+
+    status = []
+    for doc_id, metadata in zip(ids, metadatas):
+        previous = stored_hashes.get(doc_id)
+        if previous is None:
+            status.append("new")
+        elif previous.get("record_hash") == metadata["record_hash"]:
+            status.append("unchanged")
+        else:
+            status.append("updated")
+
+    # Look up stored embeddings for the changed texts, matched by content hash
+    wanted = {metadata["content_hash"] for metadata, state in zip(metadatas, status) if state in WRITE_STATES}
+    reuse = {}
+    if wanted:
+        try:
+            found = collection.get(where={"content_hash": {"$in": sorted(wanted)}}, include=['metadatas', 'embeddings'])
+        except Exception as e:
+            logger.error(f"Content hash lookup failed: {e}")
+            found = {"metadatas": [], "embeddings": []}
+        by_hash = {}
+        for metadata, embedding in zip(found['metadatas'] or [], found['embeddings'] if found['embeddings'] is not None else []):
+            if metadata and metadata.get("content_hash"):
+                by_hash.setdefault(metadata["content_hash"], embedding)
+        for index, (metadata, state) in enumerate(zip(metadatas, status)):
+            if state in WRITE_STATES and metadata["content_hash"] in by_hash:
+                reuse[index] = list(by_hash[metadata["content_hash"]])
+    return {"status": status, "metadatas": metadatas, "reuse": reuse}
+
+
+def count_status(status: List[str]) -> Dict[str, int]:
+    return {state: status.count(state) for state in ("new", "updated", "unchanged", "duplicate")}
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional
+
+from database.content_hash import WRITE_STATES, count_status
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: reader -> clean_metadata -> hash check + embed batches -> collection upsert.
+
+    Stages run in their own threads and are connected by bounded queues, so at most
+    `queue_size` batches are held in memory per stage no matter how large the input is.
+    Once `checkpoint_interval` seconds have passed since the last checkpoint, and at the end,
+    the keyword and near-duplicate indexes are saved and then the offset of the next unread
+    record is written to `checkpoint_path`; running the pipeline again on the same input
+    resumes there. A checkpoint never covers records whose index entries were not persisted.
+    Records already stored with the same content are neither embedded nor written again, so
+    re-ingesting a backlog only costs the new and changed records.
+    """
+
+    def __init__(self, vector_db, batch_size: int = 100, queue_size: int = 4, embed_workers: int = 2,
+                 checkpoint_path: Optional[str] = None, report_every: int = 10, collect_ids: bool = False,
+                 checkpoint_interval: float = 30.0):
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.embed_workers = embed_workers
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.report_every = report_every
+        self.collect_ids = collect_ids
+
+    def load_checkpoint(self) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, 'r') as file:
+            return json.load(file).get("offset", 0)
+
+    def save_checkpoint(self, offset: int):
+        if not self.checkpoint_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"offset": offset, "updated": time.time()}, file)
+        os.replace(temp_path, self.checkpoint_path)  # atomic, a crash never leaves half a checkpoint
+
+    def commit(self, offset: int):
+        """Persist the indexes, then record `offset` as the point to resume from."""
+        self.vector_db.keyword_index.flush()
+        if self.vector_db.near_duplicates is not None:
+            self.vector_db.near_duplicates.flush()
+        self.save_checkpoint(offset)
+
+    def prepare(self, data: Dict[str, Any]):
+        """Turn one input record into (id, metadata, text) the same way save_to_vector_db does."""
+        return self.vector_db.split_record(data)
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        start_offset = self.load_checkpoint()
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        stats = {
+            "start_offset": start_offset,
+            "committed_offset": start_offset,
+            "documents": 0,
+            "embedded": 0,
+            "new": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "duplicate": 0,
+            "batches": 0,
+            "embed_seconds": 0.0,
+            "write_seconds": 0.0,
+            "max_write_seconds": 0.0,
+            "ids": []
+        }
+        stats_lock = threading.Lock()
+
+        def put(target, item):
+            # Block for backpressure, but give up when another stage has failed
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fail(stage, e):
+            logger.error(f"Ingestion {stage} stage failed: {e}")
+            errors.append(e)
+            stop.set()
+
+        def reader():
+            try:
+                batch, sequence, offset = [], 0, 0
+                for offset, data in enumerate(records, start=1):
+                    if stop.is_set():
+                        return
+                    if offset <= start_offset:
+                        continue
+                    batch.append(self.prepare(data))
+                    if len(batch) >= self.batch_size:
+                        if not put(embed_queue, (sequence, offset, batch)):
+                            return
+                        batch, sequence = [], sequence + 1
+                if batch:
+                    put(embed_queue, (sequence, offset, batch))
+            except Exception as e:
+                fail("reader", e)
+            finally:
+                for _ in range(self.embed_workers):
+                    put(embed_queue, _DONE)
+
+        def embedder():
+            try:
+                while not stop.is_set():
+                    try:
+                        item = embed_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if item is _DONE:
+                        break
+                    sequence, offset, batch = item
+                    started = time.perf_counter()
+                    texts = [text for _, _, text in batch]
+                    plan = self.vector_db.plan_writes([story_id for story_id, _, _ in batch],
+                                       [metadata for _, metadata, _ in batch], texts)
+                    embeddings = self.vector_db.embed_planned(plan, texts)
+                    with stats_lock:
+                        stats["embedded"] += sum(1 for i, state in enumerate(plan["status"])
+                                                 if state in WRITE_STATES and i not in plan["reuse"])
+                        stats["embed_seconds"] += time.perf_counter() - started
+                    if not put(write_queue, (sequence, offset, batch, (plan, embeddings))):
+                        return
+            except Exception as e:
+                fail("embedding", e)
+            finally:
+                put(write_queue, _DONE)
+
+        threads = [threading.Thread(target=reader, name="ingest-reader", daemon=True)]
+        threads += [threading.Thread(target=embedder, name=f"ingest-embed-{i}", daemon=True) for i in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+
+        # The writer runs here; batches can finish embedding out of order, so they are
+        # held back until every earlier batch is committed and the checkpoint stays exact.
+        started = time.perf_counter()
+        pending, next_sequence, finished_workers = {}, 0, 0
+        last_commit = time.monotonic()
+        try:
+            while finished_workers < self.embed_workers and not stop.is_set():
+                try:
+                    item = write_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+                pending[item[0]] = item
+                while next_sequence in pending:
+                    _, offset, batch, (plan, embeddings) = pending.pop(next_sequence)
+                    self._write_batch(batch, plan, embeddings, stats)
+                    stats["committed_offset"] = offset
+                    if time.monotonic() - last_commit >= self.checkpoint_interval:
+                        self.commit(offset)
+                        last_commit = time.monotonic()
+                    next_sequence += 1
+                    if stats["batches"] % self.report_every == 0:
+                        logger.info(self.format_report(self.report(stats, time.perf_counter() - started)))
+        except Exception as e:
+            fail("write", e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        # Everything written so far, also when a stage failed: the next run resumes after it
+        self.commit(stats["committed_offset"])
+        report = self.report(stats, time.perf_counter() - started)
+        logger.info(self.format_report(report))
+        if errors:
+            raise errors[0]
+        return report
+
+    def _write_batch(self, batch: List, plan: Dict[str, Any], embeddings: List[Optional[List[float]]], stats: Dict[str, Any]):
+        ids = [story_id for story_id, _, _ in batch]
+        changed = [i for i, state in enumerate(plan["status"]) if state in WRITE_STATES]
+        started = time.perf_counter()
+        if changed:
+            self.vector_db.collection.upsert(
+                ids=[ids[i] for i in changed],
+                embeddings=[embeddings[i] for i in changed],
+                metadatas=[plan["metadatas"][i] for i in changed],
+                documents=[batch[i][2] for i in changed]
+            )
+            self.vector_db._notify_write([ids[i] for i in changed], [batch[i][2] for i in changed])
+        self.vector_db.write_promoted_duplicates()
+        elapsed = time.perf_counter() - started
+        for state, count in count_status(plan["status"]).items():
+            stats[state] += count
+        stats["documents"] += len(batch)
+        stats["batches"] += 1
+        stats["write_seconds"] += elapsed
+        stats["max_write_seconds"] = max(stats["max_write_seconds"], elapsed)
+        if self.collect_ids:
+            stats["ids"].extend(ids)
+
+    @staticmethod
+    def report(stats: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+        documents = stats["documents"]
+        return {
+            "start_offset": stats["start_offset"],
+            "committed_offset": stats["committed_offset"],
+            "documents": documents,
+            "batches": stats["batches"],
+            "new": stats["new"],
+            "updated": stats["updated"],
+            "unchanged": stats["unchanged"],
+            "duplicate": stats["duplicate"],
+            "elapsed_seconds": elapsed,
+            "docs_per_second": documents / elapsed if elapsed > 0 else 0.0,
+            "embeddings_per_second": stats["embedded"] / elapsed if elapsed > 0 else 0.0,
+            "embed_seconds": stats["embed_seconds"],
+            "avg_write_ms": 1000 * stats["write_seconds"] / stats["batches"] if stats["batches"] else 0.0,
+            "max_write_ms": 1000 * stats["max_write_seconds"],
+            "ids": stats["ids"]
+        }
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        return (f"Ingested {report['documents']} docs up to offset {report['committed_offset']} "
+                f"({report['new']} new, {report['updated']} updated, {report['unchanged']} unchanged, "
+                f"{report['duplicate']} near-duplicates) "
+                f"({report['docs_per_second']:.1f} docs/s, {report['embeddings_per_second']:.1f} embeddings/s, "
+                f"write {report['avg_write_ms']:.1f} ms avg / {report['max_write_ms']:.1f} ms max)")
@@ -0,0 +1,94 @@
+import json
+import random
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_records(file_path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the records of a top-level JSON array or of an NDJSON file one at a time.
+
+    The file is read in `chunk_size` pieces and each element is decoded as soon as it is
+    complete, so memory stays bounded by the largest single record, not the file size.
+    """
+    with open(file_path, 'r', encoding='utf-8-sig') as file:
+        head = file.read(chunk_size)
+        stripped = head.lstrip(_WHITESPACE)
+        if stripped.startswith('['):
+            yield from _iter_array(file, stripped[1:], chunk_size)
+        else:
+            yield from _iter_lines(file, head)
+
+
+def _iter_lines(file, head: str) -> Iterator[Dict[str, Any]]:
+    for line in _lines(file, head):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _lines(file, head: str) -> Iterator[str]:
+    # The head chunk was already consumed to sniff the format; finish its last partial line
+    lines = head.split('\n')
+    for line in lines[:-1]:
+        yield line
+    rest = lines[-1]
+    for line in file:
+        if rest:
+            line, rest = rest + line, ""
+        yield line
+    if rest:
+        yield rest
+
+
+def _iter_array(file, buffer: str, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    position = 0
+    eof = False
+    while True:
+        # Skip separators between elements
+        while position < len(buffer) and buffer[position] in _WHITESPACE + ",":
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of file inside JSON array")
+            buffer, position = buffer[position:], 0
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+            # A value running to the very end of the buffer may be a truncated number or literal
+            if end == len(buffer) and not eof:
+                raise ValueError("Incomplete value")
+        except ValueError:
+            if eof:
+                raise
+            buffer, position = buffer[position:], 0
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        position = end
+        # Drop consumed text so the buffer never grows beyond one record plus one chunk
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+
+def reservoir_sample(records: Iterable[Dict[str, Any]], sample_size: int, rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+    """Uniformly sample up to `sample_size` items from a stream of unknown length in one pass."""
+    rng = rng or random
+    sample = []
+    for index, record in enumerate(records):
+        if index < sample_size:
+            sample.append(record)
+        else:
+            slot = rng.randint(0, index)
+            if slot < sample_size:
+                sample[slot] = record
+    return sample
@@ -0,0 +1,263 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32, so hashed values fit in uint32
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word n-grams of the lowercased text."""
+    words = _WORD_PATTERN.findall((text or "").lower())
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures over word shingles, bucketed with LSH banding.
+
+    Every stored document is either the canonical copy of a cluster (its signature is indexed)
+    or a member that was found to be a near-duplicate of one. Members are kept as small source
+    references (id, title, source); near-duplicates found at ingest time are not stored in the
+    vector store at all, so their text and metadata are kept here. When a canonical copy is
+    removed or changes, its members are placed again: each joins a matching cluster or becomes
+    canonical itself and is queued in take_promoted() to be written to the store.
+    `bands` x `rows` = `num_perm`; candidates from a shared bucket are confirmed by the
+    estimated Jaccard similarity of their signatures reaching `threshold`.
+    Persisted like BM25Index: pickle snapshots, written atomically, and never saved when
+    `read_only` (reload_if_changed() picks up the writer's snapshots).
+    """
+
+    def __init__(self, path: Optional[str] = None, num_perm: int = 128, bands: int = 32, threshold: float = 0.7,
+                 shingle_size: int = 3, min_shingles: int = 8, save_interval: float = 30.0, read_only: bool = False):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.read_only = read_only
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.save_interval = save_interval
+        rng = np.random.default_rng(1)  # fixed so signatures stay comparable across runs
+        self.a = rng.integers(1, int(_PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), num_perm, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[int, set] = {}
+        self.cluster: Dict[str, str] = {}  # member id -> canonical id
+        self.members: Dict[str, Dict[str, Dict[str, Any]]] = {}  # canonical id -> member id -> reference
+        self.payloads: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # member id -> (text, metadata) to restore it
+        self.promoted: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # members that became canonical, not yet stored
+        self.unsigned: set = set()  # documents too short to compare, so they are in no cluster
+        self.dirty = False
+        self.last_saved = time.monotonic()
+        self.snapshot_mtime = None  # mtime of the snapshot last loaded or saved
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, doc_id) -> bool:
+        doc_id = str(doc_id)
+        return doc_id in self.signatures or doc_id in self.cluster or doc_id in self.unsigned
+
+    def canonical_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature, or None when the text is too short to compare meaningfully."""
+        grams = shingles(text, self.shingle_size)
+        if len(grams) < self.min_shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+        # (a * h + b) mod p stays below 2**64 because a, b and h are all below 2**32
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        return [(band << 32) | zlib.crc32(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def _best_match(self, signature: np.ndarray) -> Optional[str]:
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def _add_canonical(self, doc_id: str, signature: np.ndarray):
+        self.signatures[doc_id] = signature
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(doc_id)
+
+    def assign(self, doc_id: str, text: str, reference: Optional[Dict[str, Any]] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Place a document in a cluster. Returns the canonical id when it is a near-duplicate of
+        another document (recording `reference` as an alternate source, and `metadata` with the
+        text so it can be stored if that document goes away), or None when it is the canonical
+        copy of its own cluster and should be stored. Members of a previous version of the
+        document are placed again against the new text.
+        """
+        doc_id = str(doc_id)
+        with self._lock:
+            members = self._remove(doc_id)
+            self.promoted.pop(doc_id, None)
+            canonical = self._place(doc_id, text, reference, metadata)
+            self._rehome(members)
+            self._mark_dirty()
+            return canonical
+
+    def _place(self, doc_id: str, text: str, reference: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+        signature = self.signature(text)
+        canonical = self._best_match(signature) if signature is not None else None
+        if canonical is None:
+            if signature is not None:
+                self._add_canonical(doc_id, signature)
+            else:
+                self.unsigned.add(doc_id)
+            return None
+        self.cluster[doc_id] = canonical
+        self.members.setdefault(canonical, {})[doc_id] = dict(reference or {}, id=doc_id)
+        self.payloads[doc_id] = (text, dict(metadata or reference or {}))
+        return canonical
+
+    def _rehome(self, members: Dict[str, Dict[str, Any]], removed: frozenset = frozenset()):
+        """Place the members of a removed or changed canonical again; unmatched ones are promoted."""
+        for member, reference in members.items():
+            payload = self.payloads.pop(member, None)
+            if member in removed:
+                continue
+            if payload is None:
+                # Indexes written before member texts were kept cannot restore the document
+                logger.warning(f"Near-duplicate {member} lost its canonical copy and has no stored text; it is dropped")
+                continue
+            text, metadata = payload
+            reference = {key: value for key, value in reference.items() if key != "id"}
+            if self._place(member, text, reference, metadata) is None:
+                self.promoted[member] = (text, metadata)
+
+    def _remove(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """Drop a document from the index; returns the members it leaves without a canonical copy."""
+        self.unsigned.discard(doc_id)
+        canonical = self.cluster.pop(doc_id, None)
+        if canonical is not None:
+            self.members.get(canonical, {}).pop(doc_id, None)
+            self.payloads.pop(doc_id, None)
+            return {}
+        signature = self.signatures.pop(doc_id, None)
+        if signature is not None:
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self.buckets[key]
+        members = self.members.pop(doc_id, {})
+        for member in members:
+            self.cluster.pop(member, None)
+        return members
+
+    def remove(self, ids: Sequence[str]):
+        """Remove documents; members of removed canonical copies are placed again (see take_promoted)."""
+        removed = frozenset(str(doc_id) for doc_id in ids)
+        with self._lock:
+            orphans = {}
+            for doc_id in removed:
+                self.promoted.pop(doc_id, None)
+                orphans.update(self._remove(doc_id))
+            self._rehome(orphans, removed)
+            self._mark_dirty()
+
+    def take_promoted(self) -> List[Tuple[str, Dict[str, Any], str]]:
+        """Former near-duplicates that are now canonical and must be stored, as (id, metadata, text)."""
+        with self._lock:
+            promoted = [(doc_id, metadata, text) for doc_id, (text, metadata) in self.promoted.items()]
+            self.promoted.clear()
+            return promoted
+
+    def canonical_of(self, doc_id: str) -> str:
+        return self.cluster.get(str(doc_id), str(doc_id))
+
+    def alternates(self, doc_id: str) -> List[Dict[str, Any]]:
+        """Source references of the other documents in the cluster of `doc_id`."""
+        doc_id = str(doc_id)
+        with self._lock:
+            canonical = self.canonical_of(doc_id)
+            references = [reference for member, reference in self.members.get(canonical, {}).items() if member != doc_id]
+            if canonical != doc_id:
+                references.insert(0, {"id": canonical})
+            return references
+
+    def _mark_dirty(self):
+        self.dirty = True
+        if time.monotonic() - self.last_saved >= self.save_interval:
+            self.save()
+
+    def save(self):
+        if not self.path or self.read_only:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            state = {
+                "num_perm": self.num_perm, "bands": self.bands, "shingle_size": self.shingle_size,
+                "signatures": self.signatures, "cluster": self.cluster, "members": self.members,
+                "payloads": self.payloads, "promoted": self.promoted, "unsigned": self.unsigned
+            }
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'wb') as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+            self.snapshot_mtime = os.stat(self.path).st_mtime_ns
+            self.dirty = False
+            self.last_saved = time.monotonic()
+
+    def flush(self):
+        if self.dirty:
+            self.save()
+
+    def reload_if_changed(self):
+        """Load the snapshot again if another process saved a newer one."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError):
+            return
+        if mtime != self.snapshot_mtime:
+            self.load()
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'rb') as file:
+                state = pickle.load(file)
+        except Exception as e:
+            logger.error(f"Could not load near-duplicate index from {self.path}: {e}")
+            return
+        if (state["num_perm"], state["bands"], state["shingle_size"]) != (self.num_perm, self.bands, self.shingle_size):
+            logger.warning(f"Near-duplicate index at {self.path} was built with other settings; starting empty")
+            return
+        with self._lock:
+            self.snapshot_mtime = mtime
+            self.cluster, self.members = state["cluster"], state["members"]
+            self.payloads, self.promoted = state.get("payloads", {}), state.get("promoted", {})
+            self.unsigned = state.get("unsigned", set())
+            self.signatures, self.buckets = {}, {}
+            for doc_id, signature in state["signatures"].items():
+                self._add_canonical(doc_id, signature)
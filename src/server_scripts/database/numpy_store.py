@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DTYPES = ("float16", "int8")
+SPACES = ("cosine", "l2", "ip")
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma where clause into a SQLite condition over the JSON metadata column."""
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(clause) for clause in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+        field = f"json_extract(metadata, '$.\"{key}\"')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                marks = ", ".join("?" * len(value))
+                clauses.append(f"{field} {'IN' if operator == '$in' else 'NOT IN'} ({marks})")
+                params.extend(value)
+            elif operator in _OPERATORS:
+                clauses.append(f"{field} {_OPERATORS[operator]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return "(" + " AND ".join(clauses) + ")", params
+
+
+class NumpyCollection:
+    """
+    Exact-search vector store with the subset of the Chroma collection API VectorDB uses.
+
+    Embeddings live in a memory-mapped .npy matrix, float16 or int8 with a per-row scale, so
+    opening a store is instant and only the pages a scan touches are resident. Ids, documents
+    and metadata sit in a SQLite side table that also evaluates where clauses. Queries score
+    every candidate row with one matrix multiply per block. Distances follow Chroma's
+    conventions: 1 - cosine similarity, 1 - inner product, or squared L2. For cosine the
+    stored vectors are normalized, so get() returns unit vectors.
+    """
+
+    def __init__(self, directory: str, name: str = "hacker_news_stories", dtype: str = "float16",
+                 space: str = "cosine", block_rows: int = 65536):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage dtype: {dtype}")
+        if space not in SPACES:
+            raise ValueError(f"Unknown space: {space}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self.state_path = os.path.join(directory, "state.json")
+        state = {"dtype": dtype, "space": space, "dim": None, "rows": 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as file:
+                state = json.load(file)
+            if (state["dtype"], state["space"]) != (dtype, space):
+                logger.warning(f"Store {directory} keeps dtype={state['dtype']} space={state['space']}")
+        self.dtype, self.space, self.dim, self.rows = state["dtype"], state["space"], state["dim"], state["rows"]
+        self.metadata = {"backend": "numpy", "dtype": self.dtype, "space": self.space}
+
+        self.db = sqlite3.connect(os.path.join(directory, "meta.sqlite3"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS items (row INTEGER PRIMARY KEY, id TEXT UNIQUE, document TEXT, metadata TEXT)")
+        self.id_rows = dict(self.db.execute("SELECT id, row FROM items"))
+        # Rows committed to the side table after the last state write still count
+        self.rows = max([self.rows] + [row + 1 for row in self.id_rows.values()])
+        self.vectors = self.scales = self.norms = None
+        self.live = np.zeros(0, dtype=bool)
+        if self.dim:
+            self._open_arrays()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def _open_arrays(self):
+        self.vectors = np.load(self._path("vectors"), mmap_mode="r+")
+        self.scales = np.load(self._path("scales"), mmap_mode="r+")
+        self.norms = np.load(self._path("norms"), mmap_mode="r+")
+        self.live = np.zeros(len(self.vectors), dtype=bool)
+        self.live[list(self.id_rows.values())] = True
+
+    def _reserve(self, rows: int):
+        """Grow the memory-mapped arrays (doubling) so they hold at least `rows` rows."""
+        capacity = 0 if self.vectors is None else len(self.vectors)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        for name, shape, dtype in (("vectors", (capacity, self.dim), self.dtype), ("scales", (capacity,), "float32"),
+                                   ("norms", (capacity,), "float32")):
+            grown = np.lib.format.open_memmap(self._path(name) + ".tmp", mode="w+", dtype=dtype, shape=shape)
+            old = getattr(self, name)
+            if old is not None:
+                grown[:len(old)] = old
+            grown.flush()
+            del grown
+            setattr(self, name, None)
+            del old
+            os.replace(self._path(name) + ".tmp", self._path(name))
+        self._open_arrays()
+
+    def _encode(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        norms = np.linalg.norm(embeddings, axis=1).astype(np.float32)
+        if self.space == "cosine":
+            embeddings = embeddings / np.maximum(norms, 1e-12)[:, None]
+        if self.dtype == "float16":
+            return embeddings.astype(np.float16), np.ones(len(embeddings), dtype=np.float32), norms
+        scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127.0
+        quantized = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32), norms
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        return self.vectors[rows].astype(np.float32) * self.scales[rows][:, None]
+
+    def _save_state(self):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"dtype": self.dtype, "space": self.space, "dim": self.dim, "rows": self.rows}, file)
+        os.replace(temp_path, self.state_path)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        if embeddings is None:
+            raise ValueError("NumpyCollection needs embeddings for every write")
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+            rows = []
+            for doc_id in ids:
+                row = self.id_rows.get(doc_id)
+                if row is None:
+                    row = self.rows
+                    self.rows += 1
+                    self.id_rows[doc_id] = row
+                rows.append(row)
+            self._reserve(self.rows)
+            rows = np.asarray(rows, dtype=np.int64)
+            self.vectors[rows], self.scales[rows], self.norms[rows] = self._encode(matrix)
+            self.live[rows] = True
+            self.db.executemany(
+                "INSERT OR REPLACE INTO items (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(int(row), doc_id, documents[i] if documents else None, json.dumps(metadatas[i]) if metadatas else None)
+                 for i, (row, doc_id) in enumerate(zip(rows, ids))]
+            )
+            self.db.commit()
+            for array in (self.vectors, self.scales, self.norms):
+                array.flush()
+            self._save_state()
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        existing = [doc_id for doc_id in ids if doc_id in self.id_rows]
+        if existing:
+            logger.warning(f"Skipping {len(existing)} ids that already exist, e.g. {existing[0]}")
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self.id_rows]
+            pick = lambda values: [values[i] for i in keep] if values is not None else None
+            ids, embeddings, metadatas, documents = pick(ids), pick(embeddings), pick(metadatas), pick(documents)
+        if ids:
+            self.upsert(ids, embeddings, metadatas, documents)
+
+    def count(self) -> int:
+        return len(self.id_rows)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            self.live[rows] = False
+            self.db.executemany("DELETE FROM items WHERE row = ?", [(int(row),) for row in rows])
+            self.db.commit()
+            self.id_rows = {doc_id: row for doc_id, row in self.id_rows.items() if self.live[row]}
+
+    def _select_rows(self, ids=None, where=None, limit: Optional[int] = None, offset: Optional[int] = None) -> np.ndarray:
+        with self._lock:
+            return self._select_rows_locked(ids, where, limit, offset)
+
+    def _select_rows_locked(self, ids, where, limit, offset) -> np.ndarray:
+        sql, params = where_to_sql(where)
+        if ids is not None:
+            sql += f" AND id IN ({', '.join('?' * len(ids))})"
+            params = params + list(ids)
+        query = f"SELECT row FROM items WHERE {sql} ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params = params + [limit if limit is not None else -1, offset or 0]
+        return np.fromiter((row for (row,) in self.db.execute(query, params)), dtype=np.int64)
+
+    def _records(self, rows: np.ndarray) -> Dict[int, Tuple[str, Any, Any]]:
+        records = {}
+        with self._lock:
+            for start in range(0, len(rows), 900):
+                chunk = [int(row) for row in rows[start:start + 900]]
+                for row, doc_id, document, metadata in self.db.execute(
+                        f"SELECT row, id, document, metadata FROM items WHERE row IN ({', '.join('?' * len(chunk))})", chunk):
+                    records[row] = (doc_id, document, json.loads(metadata) if metadata else None)
+        return records
+
+    def get(self, ids=None, where=None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas"), **kwargs) -> Dict[str, Any]:
+        rows = self._select_rows(ids, where, limit, offset)
+        records = self._records(rows)
+        result = {"ids": [records[row][0] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [records[row][1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [records[row][2] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self._decode(rows).tolist() if len(rows) else []
+        return result
+
+    def _distances(self, arrays, queries: np.ndarray, rows: Optional[np.ndarray], start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances from every query to one block of rows (a row slice, or a slice of `rows`)."""
+        vectors, scales, norms, live = arrays
+        block_rows = np.arange(start, stop) if rows is None else rows[start:stop]
+        selector = slice(start, stop) if rows is None else block_rows
+        dots = (queries @ vectors[selector].astype(np.float32).T) * scales[selector]
+        if self.space == "l2":
+            distances = (queries ** 2).sum(axis=1, keepdims=True) - 2 * dots + norms[selector] ** 2
+        else:
+            distances = 1 - dots
+        if rows is None:
+            distances[:, ~live[start:stop]] = np.inf
+        return distances, block_rows
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), **kwargs) -> Dict[str, Any]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            # Writes may swap in grown arrays; score against the ones current at query time
+            rows = self._select_rows(where=where) if where else None
+            arrays = (self.vectors, self.scales, self.norms, self.live[:self.rows].copy())
+            total = self.rows if rows is None else len(rows)
+        best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        if self.dim is not None:
+            for start in range(0, total, self.block_rows):
+                distances, block_rows = self._distances(arrays, queries, rows, start, min(start + self.block_rows, total))
+                # Keep a running top-k so memory stays at one block of scores per query
+                distances = np.concatenate([best_distances, distances], axis=1)
+                candidates = np.concatenate([best_rows, np.broadcast_to(block_rows, (len(queries), len(block_rows)))], axis=1)
+                k = min(n_results, distances.shape[1])
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                best_distances = np.take_along_axis(distances, top, axis=1)
+                best_rows = np.take_along_axis(candidates, top, axis=1)
+
+        result = {key: [] for key in ["ids"] + [key for key in include if key in ("documents", "metadatas", "distances", "embeddings")]}
+        for distances, candidates in zip(best_distances, best_rows):
+            order = np.argsort(distances, kind="stable")
+            order = order[np.isfinite(distances[order])]
+            row_ids = candidates[order]
+            records = self._records(row_ids)
+            result["ids"].append([records[row][0] for row in row_ids])
+            if "documents" in result:
+                result["documents"].append([records[row][1] for row in row_ids])
+            if "metadatas" in result:
+                result["metadatas"].append([records[row][2] for row in row_ids])
+            if "distances" in result:
+                result["distances"].append(distances[order].tolist())
+            if "embeddings" in result:
+                result["embeddings"].append(self._decode(row_ids).tolist() if len(row_ids) else [])
+        return result
+
+    def storage_bytes(self) -> int:
+        """Bytes of embedding data for the live rows, for comparison with float64 lists."""
+        if self.dim is None:
+            return 0
+        return self.count() * (self.dim * np.dtype(self.dtype).itemsize + 8)
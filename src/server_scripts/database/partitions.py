@@ -0,0 +1,415 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Metadata "type" values mapped to partition source names
+SOURCE_TYPES = {"story": "story", "pdf": "pdf", "news": "news"}
+_QUERY_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+
+def open_collection(client, name: str, metadata: Optional[Dict[str, Any]] = None):
+    """
+    Open a collection, creating it with `metadata` (HNSW settings) only if it does not exist.
+    get_or_create_collection would overwrite the metadata of an existing collection without
+    rebuilding its index, so a configuration change is reported instead of half-applied.
+    """
+    try:
+        collection = client.get_collection(name=name)
+    except ValueError:
+        return client.create_collection(name=name, metadata=metadata or None)
+    if metadata:
+        # Chroma only records settings that were given at creation; its default space is l2
+        stored = {"hnsw:space": "l2", **(collection.metadata or {})}
+        changed = {key: value for key, value in metadata.items() if stored.get(key, value) != value}
+        if changed:
+            logger.warning(f"Collection {name} keeps its existing index settings; ignoring {changed}")
+    return collection
+
+
+def collection_space(collection) -> str:
+    """Distance space of a Chroma collection; Chroma's default is l2."""
+    return (collection.metadata or {}).get("hnsw:space", "l2")
+
+
+def space_distances(space: str, query, embeddings) -> List[float]:
+    """Chroma's distance between one query and each embedding: squared l2, 1 - dot (ip) or 1 - cosine."""
+    query = np.asarray(query, dtype=np.float64)
+    embeddings = np.asarray(embeddings, dtype=np.float64).reshape(-1, len(query))
+    if space == "l2":
+        return (((embeddings - query) ** 2).sum(axis=1)).tolist()
+    if space == "ip":
+        return (1.0 - embeddings @ query).tolist()
+    norms = np.maximum(np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query), 1e-12)
+    return (1.0 - embeddings @ query / norms).tolist()
+
+
+def partition_key(metadata: Optional[Dict[str, Any]]) -> str:
+    """Source and month of a document, e.g. "story__2024_05"; undated documents go to "undated"."""
+    metadata = metadata or {}
+    source = SOURCE_TYPES.get(str(metadata.get("type", "")).lower(), "other")
+    timestamp = metadata.get("time")
+    if isinstance(timestamp, (int, float)):
+        month = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y_%m")
+    else:
+        month = "undated"
+    return f"{source}__{month}"
+
+
+def _time_lower_bound(where: Optional[Dict[str, Any]]) -> Optional[float]:
+    """The "$gte"/"$gt" bound on "time" in a where clause (top level or inside "$and"), if any."""
+    if not where:
+        return None
+    if "$and" in where:
+        bounds = [_time_lower_bound(clause) for clause in where["$and"]]
+        bounds = [bound for bound in bounds if bound is not None]
+        return max(bounds) if bounds else None
+    condition = where.get("time")
+    if isinstance(condition, dict):
+        for operator in ("$gte", "$gt"):
+            if isinstance(condition.get(operator), (int, float)):
+                return condition[operator]
+    return None
+
+
+def _source_filter(where: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The source a where clause pins with {"type": "..."} or {"type": {"$eq": "..."}}, if any."""
+    if not where:
+        return None
+    if "$and" in where:
+        for clause in where["$and"]:
+            source = _source_filter(clause)
+            if source:
+                return source
+        return None
+    condition = where.get("type")
+    if isinstance(condition, dict):
+        condition = condition.get("$eq")
+    if isinstance(condition, str):
+        return SOURCE_TYPES.get(condition.lower(), "other")
+    return None
+
+
+class PartitionedCollection:
+    """
+    A set of Chroma collections that behaves like one collection.
+
+    Writes are routed by partition_key() to "<prefix>__<source>__<YYYY_MM>" collections, so
+    each HNSW index stays small. Queries only touch partitions that can match the where clause
+    (time window, source type), run them concurrently and merge the top-k by distance, with
+    hits from a partition in another distance space re-scored in the configured one. The
+    pre-partitioning collection named `prefix` is kept as a legacy partition that is only read
+    and deleted from: a write moves the document into its partition. Every id lives in one
+    active partition; a write whose partition key changed removes the previous copy, found in
+    the partition a get(ids=...) (the write plan) last saw it in.
+    Partitions can be detached (excluded from reads and writes) or archived to a separate
+    Chroma directory without touching the active ones.
+    """
+
+    def __init__(self, client, prefix: str = "hacker_news_stories", registry_path: Optional[str] = None,
+                 collection_metadata: Optional[Dict[str, Any]] = None, max_workers: int = 8,
+                 max_locations: int = 100000):
+        self.client = client
+        self.prefix = prefix
+        self.name = prefix
+        self.registry_path = registry_path
+        self.collection_metadata = collection_metadata
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="partition")
+        self._lock = threading.Lock()
+        # id -> collection holding it (None: stored nowhere), as seen by the last get(ids=...) or write
+        self.locations = OrderedDict()
+        self.max_locations = max_locations
+        self.detached = set()
+        self.partitions = {}
+        self.legacy = None
+        self.refresh()
+        if self.legacy is not None and collection_space(self.legacy) != self.space:
+            logger.warning(f"Legacy collection {prefix} uses {collection_space(self.legacy)} distance; "
+                           f"its hits are re-scored in {self.space} when merged")
+
+    def refresh(self):
+        """
+        Discover partitions created, archived or detached since the last scan, including by
+        another process writing to the same Chroma directory.
+        """
+        detached = set(self._load_registry().get("detached", []))
+        listed = {(c if isinstance(c, str) else c.name): c for c in self.client.list_collections()}
+
+        def current(collection, name, opener=self._open):
+            # A collection dropped and created again under the same name has a new id
+            if collection is not None and getattr(collection, "id", None) == getattr(listed[name], "id", None):
+                return collection
+            return opener(name)
+
+        with self._lock:
+            partitions = {name[len(self.prefix) + 2:]: name for name in listed if name.startswith(self.prefix + "__")}
+            partitions = {key: current(self.partitions.get(key), name) for key, name in partitions.items()}
+            changed = detached != self.detached or any(
+                self.partitions.get(key) is not collection for key, collection in partitions.items()
+            ) or set(partitions) != set(self.partitions)
+            self.detached, self.partitions = detached, partitions
+            if self.prefix in listed:
+                self.legacy = current(self.legacy, self.prefix, lambda name: self.client.get_collection(name=name))
+            else:
+                self.legacy = None
+            if changed:
+                self.locations.clear()
+
+    @property
+    def space(self) -> str:
+        """The distance space merged query results are reported in."""
+        return (self.collection_metadata or {}).get("hnsw:space", "l2")
+
+    def _open(self, name: str):
+        return open_collection(self.client, name, self.collection_metadata)
+
+    def _load_registry(self) -> Dict[str, Any]:
+        if not self.registry_path or not os.path.exists(self.registry_path):
+            return {}
+        with open(self.registry_path, 'r') as file:
+            return json.load(file)
+
+    def _save_registry(self):
+        if not self.registry_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.registry_path)), exist_ok=True)
+        temp_path = self.registry_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"detached": sorted(self.detached)}, file)
+        os.replace(temp_path, self.registry_path)
+
+    def _partition(self, key: str):
+        if key in self.detached:
+            raise ValueError(f"Partition {key} is detached; attach it before writing to it")
+        with self._lock:
+            if key not in self.partitions:
+                self.partitions[key] = self._open(f"{self.prefix}__{key}")
+            return self.partitions[key]
+
+    def active_partitions(self, where: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """Collections a query with this where clause has to look at."""
+        lower_bound = _time_lower_bound(where)
+        source = _source_filter(where)
+        cutoff_month = None
+        if lower_bound is not None:
+            cutoff_month = datetime.fromtimestamp(lower_bound, tz=timezone.utc).strftime("%Y_%m")
+        selected = []
+        for key, collection in sorted(self.partitions.items()):
+            if key in self.detached:
+                continue
+            partition_source, month = key.split("__", 1)
+            if source and partition_source != source:
+                continue
+            # A time bound can never match undated documents or months wholly before it
+            if cutoff_month and (month == "undated" or month < cutoff_month):
+                continue
+            selected.append(collection)
+        if self.legacy is not None:
+            selected.append(self.legacy)
+        return selected
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": key, "count": collection.count(), "detached": key in self.detached}
+            for key, collection in sorted(self.partitions.items())
+        ]
+
+    def _group(self, ids, metadatas) -> Dict[str, List[int]]:
+        groups = {}
+        for i, metadata in enumerate(metadatas or [None] * len(ids)):
+            groups.setdefault(partition_key(metadata), []).append(i)
+        return groups
+
+    def _write(self, method: str, ids, embeddings=None, metadatas=None, documents=None):
+        for key, positions in self._group(ids, metadatas).items():
+            pick = lambda values: [values[i] for i in positions] if values is not None else None
+            target = self._partition(key)
+            getattr(target, method)(
+                ids=pick(ids), embeddings=pick(embeddings), metadatas=pick(metadatas), documents=pick(documents)
+            )
+            self._remove_other_copies(target, pick(ids))
+
+    def _locate(self, locations: Dict[str, Any]):
+        with self._lock:
+            for doc_id, collection in locations.items():
+                self.locations[doc_id] = collection
+                self.locations.move_to_end(doc_id)
+            while len(self.locations) > self.max_locations:
+                self.locations.popitem(last=False)
+
+    def _remove_other_copies(self, target, ids: List[str]):
+        """
+        Delete `ids` from every active partition except `target`, after they were written there.
+        This migrates legacy documents on their first write and moves a document whose source
+        or month changed, so reads never see two versions of one id. Ids whose location is
+        known (the write plan read them first) are deleted only where they were; the others
+        are looked up in every partition.
+        """
+        stale, unknown = {}, []
+        with self._lock:
+            for doc_id in ids:
+                if doc_id not in self.locations:
+                    unknown.append(doc_id)
+                elif self.locations[doc_id] is not None and self.locations[doc_id] is not target:
+                    stale.setdefault(id(self.locations[doc_id]), (self.locations[doc_id], []))[1].append(doc_id)
+        moved = 0
+        for collection, found in stale.values():
+            collection.delete(ids=found)
+            moved += len(found)
+        if unknown:
+            def remove(collection):
+                found = collection.get(ids=unknown, include=[])["ids"]
+                if found:
+                    collection.delete(ids=found)
+                return len(found)
+
+            others = [collection for collection in self.active_partitions() if collection is not target]
+            moved += sum(self.executor.map(remove, others))
+        self._locate(dict.fromkeys(ids, target))
+        if moved:
+            logger.info(f"Moved {moved} documents into partition {target.name}")
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("add", ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("upsert", ids, embeddings, metadatas, documents)
+
+    def count(self) -> int:
+        return sum(self.executor.map(lambda collection: collection.count(), self.active_partitions()))
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), **kwargs) -> Dict[str, Any]:
+        partitions = self.active_partitions(where)
+        include = list(include)
+
+        def run(collection):
+            size = collection.count()
+            if size == 0:
+                return None
+            # Distances of different spaces do not compare (squared l2 is twice the cosine
+            # distance on unit vectors), so other-space hits are re-scored from their embeddings
+            rescore = collection_space(collection) != self.space
+            wanted = include + ["embeddings"] if rescore and "embeddings" not in include else include
+            try:
+                result = collection.query(query_embeddings=query_embeddings, n_results=min(n_results, size),
+                                          where=where, include=wanted, **kwargs)
+            except Exception as e:
+                logger.error(f"Query on partition {collection.name} failed: {e}")
+                return None
+            if rescore:
+                result["distances"] = [
+                    space_distances(self.space, query, embeddings) if len(embeddings) else []
+                    for query, embeddings in zip(query_embeddings, result["embeddings"])
+                ]
+            return result
+
+        partial = [result for result in self.executor.map(run, partitions) if result is not None]
+        keys = ["ids"] + [key for key in include if key in _QUERY_KEYS]
+        merged = {key: [] for key in keys}
+        for row in range(len(query_embeddings)):
+            hits = []
+            for result in partial:
+                for column in range(len(result["ids"][row])):
+                    hits.append((result["distances"][row][column], result, column))
+            hits.sort(key=lambda hit: hit[0])
+            for key in keys:
+                merged[key].append([hit[1][key][row][hit[2]] for hit in hits[:n_results]])
+        return merged
+
+    def get(self, ids=None, where=None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas"), **kwargs) -> Dict[str, Any]:
+        include = list(include)
+        keys = ["ids"] + [key for key in include if key in _QUERY_KEYS]
+        merged = {key: [] for key in keys}
+        partitions = self.active_partitions(where)
+        if ids is not None:
+            # Each id lives in exactly one partition; ask all of them at once
+            results = list(self.executor.map(lambda c: c.get(ids=ids, where=where, include=include, **kwargs), partitions))
+            for result in results:
+                for key in keys:
+                    merged[key].extend(result[key] if result[key] is not None else [])
+            if where is None:
+                # Remembered so that writing these ids next only touches the partitions holding them
+                found = {doc_id: collection for collection, result in zip(partitions, results) for doc_id in result["ids"]}
+                self._locate({doc_id: found.get(doc_id) for doc_id in ids})
+            return merged
+
+        # Paged reads walk the partitions in name order as if they were one collection
+        skip, remaining = offset or 0, limit
+        for collection in partitions:
+            if remaining is not None and remaining <= 0:
+                break
+            if skip:
+                # Chroma cannot count filtered matches, so a filtered skip reads their ids
+                size = collection.count() if where is None else len(collection.get(where=where, include=[])["ids"])
+                if skip >= size:
+                    skip -= size
+                    continue
+            result = collection.get(where=where, limit=remaining, offset=skip, include=include, **kwargs)
+            skip = 0
+            for key in keys:
+                merged[key].extend(result[key] if result[key] is not None else [])
+            if remaining is not None:
+                remaining -= len(result["ids"])
+        return merged
+
+    def delete(self, ids=None, where=None):
+        for collection in self.active_partitions():
+            collection.delete(ids=ids, where=where)
+        with self._lock:
+            if ids is not None and where is None:
+                for doc_id in ids:
+                    self.locations.pop(doc_id, None)
+            else:
+                self.locations.clear()
+
+    def detach_partition(self, key: str):
+        """Exclude a partition from reads and writes while keeping its data in place."""
+        self.detached.add(key)
+        self._save_registry()
+        self._forget_locations()
+
+    def attach_partition(self, key: str):
+        self.detached.discard(key)
+        self._save_registry()
+        self._forget_locations()
+
+    def _forget_locations(self):
+        # Which partitions are active changed, so remembered locations may point past them
+        with self._lock:
+            self.locations.clear()
+
+    def archive_partition(self, key: str, archive_directory: str, page_size: int = 1000) -> int:
+        """
+        Copy a partition into a separate Chroma directory and drop it from the live client.
+        Only that partition is read and deleted; the active ones are never rewritten.
+        """
+        import chromadb
+
+        source = self.partitions[key]
+        archive = chromadb.PersistentClient(path=archive_directory)
+        target = archive.get_or_create_collection(name=source.name, metadata=source.metadata)
+        copied = 0
+        while True:
+            page = source.get(limit=page_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            target.upsert(ids=page["ids"], embeddings=page["embeddings"], metadatas=page["metadatas"], documents=page["documents"])
+            copied += len(page["ids"])
+        self.client.delete_collection(name=source.name)
+        with self._lock:
+            del self.partitions[key]
+        self.detached.discard(key)
+        self._save_registry()
+        self._forget_locations()
+        logger.info(f"Archived partition {key} ({copied} documents) to {archive_directory}")
+        return copied
@@ -0,0 +1,78 @@
+import bisect
+import logging
+from itertools import repeat
+from typing import Iterable, Iterator, List, Tuple
+
+import pypdf
+
+logger = logging.getLogger(__name__)
+
+
+def page_count(pdf_path: str) -> int:
+    return len(pypdf.PdfReader(pdf_path).pages)
+
+
+def extract_pages(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Text of pages [start, stop) as (1-based page number, text); runs in a worker process."""
+    reader = pypdf.PdfReader(pdf_path)
+    stop = min(stop, len(reader.pages))
+    return [(number + 1, reader.pages[number].extract_text() or "") for number in range(start, stop)]
+
+
+def iter_pages(pdf_path: str, executor=None, pages_per_task: int = 8, workers: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, text) in page order. With a process pool, page ranges are extracted in
+    parallel and streamed back as soon as the earlier ones are done. Every task parses the file
+    again, so ranges are at least `pages_per_task` pages and about two per worker.
+    """
+    total = page_count(pdf_path)
+    if executor is not None:
+        pages_per_task = max(pages_per_task, -(-total // (2 * workers)))
+    starts = list(range(0, total, pages_per_task))
+    if executor is None:
+        for start in starts:
+            yield from extract_pages(pdf_path, start, start + pages_per_task)
+        return
+    stops = [start + pages_per_task for start in starts]
+    for pages in executor.map(extract_pages, repeat(pdf_path), starts, stops):
+        yield from pages
+
+
+# Pages are joined with a blank line, so a page break is also a paragraph break for the splitter
+PAGE_SEPARATOR = "\n\n"
+
+
+def join_pages(texts: Iterable[str]) -> str:
+    """The document text iter_chunks splits: page texts joined with PAGE_SEPARATOR."""
+    return PAGE_SEPARATOR.join(texts)
+
+
+def _page_at(offsets: List[int], numbers: List[int], offset: int) -> int:
+    return numbers[max(bisect.bisect_right(offsets, offset) - 1, 0)]
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], text_splitter) -> Iterator[Tuple[str, int, int]]:
+    """
+    Split a stream of pages with text_splitter.split_text(join_pages(texts)) and map each chunk
+    back to the pages it spans. Page texts are collected in a list and joined once, so the
+    document is built in linear time.
+
+    :return: Iterator of (chunk, first page, last page)
+    """
+    texts, offsets, numbers = [], [], []
+    length = 0
+    for number, text in pages:
+        if texts:
+            length += len(PAGE_SEPARATOR)
+        offsets.append(length)
+        numbers.append(number)
+        texts.append(text)
+        length += len(text)
+    document = join_pages(texts)
+    # Chunks come back in document order, so each one is searched for after the previous start
+    cursor = 0
+    for chunk in text_splitter.split_text(document):
+        position = document.find(chunk, cursor)
+        position = cursor if position < 0 else position
+        yield chunk, _page_at(offsets, numbers, position), _page_at(offsets, numbers, position + len(chunk) - 1)
+        cursor = position + 1
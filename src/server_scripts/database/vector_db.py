@@ -1,21 +1,356 @@
 import os
 import json
+import hashlib
 import random
 import uuid
+import atexit
+import time
 import chromadb
-from typing import Dict, Any, List
-from services.chat import SolarHackerNews
-import pypdf
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+from services.chat import SolarHackerNews, PASSAGE_EMBEDDING_MODEL
+from database.ingestion import IngestionPipeline
+from database.json_stream import iter_json_records, reservoir_sample
+from database.bm25_index import BM25Index
+from database.partitions import PartitionedCollection, open_collection, partition_key
+from database.numpy_store import NumpyCollection
+from database.content_hash import WRITE_STATES, plan_writes, count_status
+from database.near_duplicates import NearDuplicateIndex
+from database.pdf_ingest import iter_pages, iter_chunks
+from database.verification import StorageVerifier
+from utils.config import is_worker_bootstrap
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+logger = logging.getLogger(__name__)
+
+# Route documents into per-source, per-month collections (0 keeps the single collection)
+PARTITIONED = os.getenv("WOLFARE_PARTITIONED", "1") == "1"
+PARTITION_QUERY_WORKERS = int(os.getenv("WOLFARE_PARTITION_QUERY_WORKERS", "8"))
+
+# "chroma", or "numpy" for the in-process memory-mapped store (exact search, no Chroma server state)
+VECTOR_BACKEND = os.getenv("WOLFARE_VECTOR_BACKEND", "chroma")
+NUMPY_STORAGE_DTYPE = os.getenv("WOLFARE_NUMPY_DTYPE", "float16")
+
+# Estimated Jaccard similarity of word shingles above which a new document is stored only as an
+# alternate source of an existing one (0 disables near-duplicate detection)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("WOLFARE_NEAR_DUP_THRESHOLD", "0.7"))
+
+# Whether this process saves the keyword and near-duplicate snapshots. Only the ingestion
+# process should; the API server sets 0 and reloads the snapshots when the data changes
+INDEX_WRITER = os.getenv("WOLFARE_INDEX_WRITER", "1") == "1"
+
+# PDF ingestion: page extraction processes, pages per extraction task and PDFs handled at once
+PDF_WORKERS = int(os.getenv("WOLFARE_PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_TASK = int(os.getenv("WOLFARE_PDF_PAGES_PER_TASK", "8"))
+PDF_CONCURRENCY = int(os.getenv("WOLFARE_PDF_CONCURRENCY", "4"))
+
+# HNSW index settings, applied when a collection is created (benchmarks/hnsw_benchmark.py compares them).
+# Solar embeddings are compared by angle, so cosine is the default space rather than Chroma's l2.
+HNSW_SPACES = ("cosine", "l2", "ip")
+HNSW_SPACE = os.getenv("WOLFARE_HNSW_SPACE", "cosine")
+HNSW_M = int(os.getenv("WOLFARE_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("WOLFARE_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("WOLFARE_HNSW_SEARCH_EF", "50"))
+
+
+def hnsw_metadata(space: str = HNSW_SPACE, m: int = HNSW_M, construction_ef: int = HNSW_CONSTRUCTION_EF,
+                  search_ef: int = HNSW_SEARCH_EF) -> Dict[str, Any]:
+    """Chroma collection metadata for the given HNSW distance space and graph parameters."""
+    if space not in HNSW_SPACES:
+        raise ValueError(f"Unknown HNSW space: {space}")
+    return {"hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+
 
 class VectorDB:
-    def __init__(self):
-        persist_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chroma_db')
-        self.chroma_client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.chroma_client.get_or_create_collection(name="hacker_news_stories")
+    def __init__(self, hnsw_space: str = HNSW_SPACE, hnsw_m: int = HNSW_M,
+                 hnsw_construction_ef: int = HNSW_CONSTRUCTION_EF, hnsw_search_ef: int = HNSW_SEARCH_EF,
+                 backend: str = VECTOR_BACKEND, index_writer: bool = INDEX_WRITER):
+        data_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+        persist_directory = os.path.join(data_directory, 'chroma_db')
+        self.checkpoint_directory = os.path.join(data_directory, 'ingestion_checkpoints')
+        self.archive_directory = os.path.join(data_directory, 'chroma_archive')
+        self.backend = backend
+        self.chroma_client = None
+        # Existing collections keep the settings they were built with
+        self.collection_metadata = hnsw_metadata(hnsw_space, hnsw_m, hnsw_construction_ef, hnsw_search_ef)
+        if backend == "numpy":
+            self.collection = NumpyCollection(
+                os.path.join(data_directory, 'numpy_store', 'hacker_news_stories'),
+                dtype=NUMPY_STORAGE_DTYPE, space=hnsw_space
+            )
+            self.collection_metadata = self.collection.metadata
+        elif backend != "chroma":
+            raise ValueError(f"Unknown vector backend: {backend}")
+        elif PARTITIONED:
+            self.chroma_client = chromadb.PersistentClient(path=persist_directory)
+            self.collection = PartitionedCollection(
+                self.chroma_client, prefix="hacker_news_stories",
+                registry_path=os.path.join(data_directory, 'partitions.json'),
+                collection_metadata=self.collection_metadata,
+                max_workers=PARTITION_QUERY_WORKERS
+            )
+        else:
+            self.chroma_client = chromadb.PersistentClient(path=persist_directory)
+            self.collection = open_collection(self.chroma_client, "hacker_news_stories", self.collection_metadata)
         self.solar = SolarHackerNews() # Initialize Solar LLM
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        self.pdf_executor = None
+        self._pdf_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Rewritten after every write so other processes (the API server's response cache) see it
+        self.generation_path = os.path.join(data_directory, 'generation')
+        self.seen_version = self.data_version()  # the version refresh() last caught up with
+
+        # Lexical index over the same documents, kept next to the Chroma files
+        self.index_writer = index_writer
+        self.keyword_index = BM25Index(os.path.join(data_directory, 'bm25_index', 'hacker_news_stories.pkl'),
+                                       read_only=not index_writer)
+        atexit.register(self.keyword_index.flush)
+
+        # MinHash/LSH clusters of near-identical documents (the same incident from several outlets)
+        self.near_duplicates = None
+        if NEAR_DUPLICATE_THRESHOLD > 0:
+            self.near_duplicates = NearDuplicateIndex(
+                os.path.join(data_directory, 'near_duplicates', 'hacker_news_stories.pkl'),
+                threshold=NEAR_DUPLICATE_THRESHOLD, read_only=not index_writer
+            )
+            atexit.register(self.near_duplicates.flush)
+
+        # A crash between a write and the next index snapshot leaves the indexes behind the store.
+        # Readers leave the repair to the writer and pick up its snapshots in refresh()
+        if index_writer:
+            stored = self.collection.count()
+            empty_clusters = self.near_duplicates is not None and len(self.near_duplicates) == 0 and not self.near_duplicates.unsigned
+            if len(self.keyword_index) != stored or (empty_clusters and stored):
+                self.reconcile_indexes()
+
+    @staticmethod
+    def source_reference(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """The few metadata fields kept for a near-duplicate that is not stored itself."""
+        return {key: metadata[key] for key in ("title", "source", "url", "time", "type") if metadata.get(key) is not None}
+
+    def stored_ids(self, page_size: int = 1000) -> List[str]:
+        ids, offset = [], 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=[])
+            if not page['ids']:
+                break
+            ids += page['ids']
+            offset += len(page['ids'])
+        return ids
+
+    def reconcile_indexes(self, page_size: int = 1000):
+        """
+        Bring the keyword and near-duplicate indexes in line with the collection: stored
+        documents they are missing are indexed (all of them on the first run) and ids that are
+        no longer stored are dropped. Only the texts of missing documents are read. Stored
+        near-duplicates stay stored; they are collapsed into one result at query time.
+        """
+        stored = self.stored_ids(page_size)
+        stored_set = set(stored)
+        missing = [doc_id for doc_id in stored if doc_id not in self.keyword_index
+                   or (self.near_duplicates is not None and doc_id not in self.near_duplicates)]
+        for i in range(0, len(missing), page_size):
+            page = self.collection.get(ids=missing[i:i + page_size], include=['documents', 'metadatas'])
+            unindexed = [j for j, doc_id in enumerate(page['ids']) if doc_id not in self.keyword_index]
+            self.keyword_index.add_documents([page['ids'][j] for j in unindexed], [page['documents'][j] for j in unindexed])
+            if self.near_duplicates is not None:
+                for doc_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                    if doc_id not in self.near_duplicates:
+                        self.near_duplicates.assign(doc_id, document, self.source_reference(metadata or {}))
+        self.keyword_index.delete_documents([doc_id for doc_id in self.keyword_index.ids() if doc_id not in stored_set])
+        if self.near_duplicates is not None:
+            # Canonical copies whose write never happened; members left without one are stored
+            # with the next write (see write_promoted_duplicates)
+            self.near_duplicates.remove([doc_id for doc_id in self.near_duplicates.canonical_ids() if doc_id not in stored_set])
+            self.near_duplicates.flush()
+        self.keyword_index.flush()
+        logger.info(f"Indexes reconciled with {len(stored)} stored documents ({len(missing)} were missing)")
+
+    def plan_writes(self, ids: List[str], metadatas: List[Dict[str, Any]], texts: List[str]) -> Dict[str, Any]:
+        """
+        content_hash.plan_writes(), plus near-duplicate detection: a new document that is close
+        to a stored one (or to an earlier one in the batch) becomes "duplicate" and is kept only
+        as an alternate source reference of that document.
+        """
+        plan = plan_writes(self.collection, ids, metadatas, texts)
+        # Unchanged documents are not written again; ones stored before a crash lost the index
+        # snapshot are indexed here, since a resumed or repeated run is what reaches them
+        unindexed = [i for i, state in enumerate(plan["status"]) if state == "unchanged" and ids[i] not in self.keyword_index]
+        if unindexed:
+            self.keyword_index.add_documents([ids[i] for i in unindexed], [texts[i] for i in unindexed])
+        if self.near_duplicates is None:
+            return plan
+        for i, state in enumerate(plan["status"]):
+            if state == "unchanged" and ids[i] not in self.near_duplicates:
+                self.near_duplicates.assign(ids[i], texts[i], self.source_reference(metadatas[i]))
+            if state not in WRITE_STATES:
+                continue
+            canonical = self.near_duplicates.assign(ids[i], texts[i], self.source_reference(metadatas[i]), metadatas[i])
+            # An updated document that already has a stored copy is kept and collapsed at query time
+            if canonical is not None and state == "new":
+                plan["status"][i] = "duplicate"
+                plan["reuse"].pop(i, None)
+        return plan
+
+    def write_promoted_duplicates(self) -> int:
+        """
+        Store near-duplicates that lost their canonical copy (it was deleted, archived or changed
+        too much) and became canonical themselves; until now they were only source references.
+        """
+        if self.near_duplicates is None:
+            return 0
+        written = 0
+        promoted = self.near_duplicates.take_promoted()
+        while promoted:
+            ids, metadatas, texts = (list(column) for column in zip(*promoted))
+            self.write_documents(ids, metadatas, texts)
+            written += len(ids)
+            promoted = self.near_duplicates.take_promoted()
+        if written:
+            logger.info(f"Stored {written} near-duplicates whose canonical copy was removed")
+        return written
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        if not isinstance(self.collection, PartitionedCollection):
+            return [{"name": self.collection.name, "count": self.collection.count(), "detached": False}]
+        return self.collection.list_partitions()
+
+    def detach_partition(self, key: str):
+        """Stop reading from and writing to a partition such as "story__2023_01"; its data stays on disk."""
+        ids = self.collection.partitions[key].get(include=[])['ids']
+        self.collection.detach_partition(key)
+        self._notify_write(ids)
+
+    def attach_partition(self, key: str):
+        self.collection.attach_partition(key)
+        self._notify_write(self.collection.partitions[key].get(include=[])['ids'])
+
+    def archive_partition(self, key: str, archive_directory: Optional[str] = None) -> int:
+        """Move a partition into its own Chroma directory under data/chroma_archive and drop it here."""
+        archive_directory = archive_directory or os.path.join(self.archive_directory, key)
+        ids = self.collection.partitions[key].get(include=[])['ids']
+        later = []
+        if self.near_duplicates is not None:
+            # Near-duplicates of archived documents are only references. Those of the same
+            # month and source are stored in the partition first so they are archived with it;
+            # the others are stored live afterwards
+            self.near_duplicates.remove(ids)
+            while True:
+                promoted = self.near_duplicates.take_promoted()
+                same = [item for item in promoted if partition_key(item[1]) == key]
+                later += [item for item in promoted if partition_key(item[1]) != key]
+                if not same:
+                    break
+                if key in self.collection.detached:
+                    self.collection.attach_partition(key)  # archiving drops it from the registry anyway
+                self.write_documents(*(list(column) for column in zip(*same)))
+                # Some may have joined a live cluster instead; they stay references to it
+                stored = self.collection.partitions[key].get(ids=[doc_id for doc_id, _, _ in same], include=[])['ids']
+                ids += stored
+                self.near_duplicates.remove(stored)
+        copied = self.collection.archive_partition(key, archive_directory)
+        self.keyword_index.delete_documents(ids)
+        self.keyword_index.flush()
+        if later:
+            self.write_documents(*(list(column) for column in zip(*later)))
+        self.write_promoted_duplicates()
+        self._notify_write(ids)
+        return copied
+
+    @staticmethod
+    def time_window_filter(days: Optional[int], filter_condition: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Combine a where clause with a "time within the last `days` days" condition so Chroma
+        skips older documents before scoring. Documents without a "time" never match a window.
+        """
+        if not days:
+            return filter_condition
+        window = {"time": {"$gte": int(time.time() - days * 86400)}}
+        if not filter_condition:
+            return window
+        return {"$and": [filter_condition, window]}
+
+    def keyword_search(self, query_text: str, n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        BM25 search over stored documents, returned in collection.query result format.
+        Distances are 1 - score / best score, so the best lexical match has distance 0.
+        With a where clause, hits whose metadata does not match are dropped.
+        """
+        # Over-fetch when filtering, since some lexical hits will fall outside the filter
+        hits = self.keyword_index.search(query_text, n_results * 4 if where else n_results)
+        if not hits:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        stored = self.collection.get(ids=[doc_id for doc_id, _ in hits], where=where, include=['documents', 'metadatas'])
+        by_id = {doc_id: (document, metadata) for doc_id, document, metadata in zip(stored['ids'], stored['documents'], stored['metadatas'])}
+        best = hits[0][1]
+        hits = [(doc_id, score) for doc_id, score in hits if doc_id in by_id][:n_results]
+        return {
+            "ids": [[doc_id for doc_id, _ in hits]],
+            "documents": [[by_id[doc_id][0] for doc_id, _ in hits]],
+            "metadatas": [[by_id[doc_id][1] for doc_id, _ in hits]],
+            "distances": [[1 - score / best for _, score in hits]],
+            "scores": [[score for _, score in hits]]
+        }
+
+    def data_version(self) -> str:
+        """
+        Token that changes whenever documents are written or removed, including by ingestion
+        scripts running outside this process ("" before the first write). Reading it is one
+        small file read, so it is cheap enough for every cache lookup.
+        """
+        try:
+            with open(self.generation_path, 'r') as file:
+                return file.read()
+        except OSError:
+            return ""
+
+    def refresh(self) -> str:
+        """
+        Pick up what other processes wrote since the last call (partitions created, archived
+        or detached by an ingestion script, and its newer index snapshots); cheap when nothing
+        changed. Returns the data version.
+        """
+        version = self.data_version()
+        if not self.index_writer:
+            # Snapshots are saved after the writes they cover, so they are checked on every call
+            with self._refresh_lock:
+                self.keyword_index.reload_if_changed()
+                if self.near_duplicates is not None:
+                    self.near_duplicates.reload_if_changed()
+        if version == self.seen_version:
+            return version
+        with self._refresh_lock:
+            if version != self.seen_version:
+                if isinstance(self.collection, PartitionedCollection):
+                    self.collection.refresh()
+                self.seen_version = version
+        return version
+
+    def _notify_write(self, ids: List[str], documents: Optional[List[str]] = None):
+        if not ids:
+            return
+        if documents is not None:
+            self.keyword_index.add_documents(ids, documents)
+        # A fresh token rather than a touch: mtimes can repeat for writes close together
+        try:
+            os.makedirs(os.path.dirname(self.generation_path), exist_ok=True)
+            temp_path = f"{self.generation_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as file:
+                file.write(uuid.uuid4().hex)
+            os.replace(temp_path, self.generation_path)
+        except OSError as e:
+            logger.error(f"Could not record write generation: {e}")
+
+    @classmethod
+    def split_record(cls, data: Dict[str, Any]) -> Tuple[str, Dict[str, Any], str]:
+        """Turn one input story into (id, cleaned metadata, text) as it is stored."""
+        metadata = cls.clean_metadata(data['metadata'])
+        text = metadata.pop('text', '')  # Remove 'text' from metadata and store it separately
+        return str(data['id']), metadata, text
 
     @staticmethod
     def clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -32,112 +367,156 @@ class VectorDB:
         return cleaned
     
 
+    def embed_planned(self, plan: Dict[str, Any], texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings for a plan_writes() batch: reused where possible, None for unchanged items."""
+        embeddings = [plan["reuse"].get(i) for i in range(len(texts))]
+        missing = [i for i, state in enumerate(plan["status"]) if state in WRITE_STATES and embeddings[i] is None]
+        if missing:
+            for i, embedding in zip(missing, self.solar.embed_documents([texts[i] for i in missing])):
+                embeddings[i] = embedding
+        return embeddings
+
+    def write_documents(self, ids: List[str], metadatas: List[Dict[str, Any]], texts: List[str],
+                        batch_size: int = 100) -> Dict[str, int]:
+        """
+        Idempotent write: documents whose text and metadata are already stored are skipped,
+        near-duplicates of stored documents are recorded as alternate sources, changed ones are
+        upserted, and only texts not stored anywhere are embedded.
+
+        :return: Counts of new, updated, unchanged and duplicate documents
+        """
+        counts = {"new": 0, "updated": 0, "unchanged": 0, "duplicate": 0}
+        for i in range(0, len(ids), batch_size):
+            batch_ids, batch_texts = ids[i:i+batch_size], texts[i:i+batch_size]
+            plan = self.plan_writes(batch_ids, metadatas[i:i+batch_size], batch_texts)
+            embeddings = self.embed_planned(plan, batch_texts)
+            changed = [j for j, state in enumerate(plan["status"]) if state in WRITE_STATES]
+            if changed:
+                self.collection.upsert(
+                    ids=[batch_ids[j] for j in changed],
+                    embeddings=[embeddings[j] for j in changed],
+                    metadatas=[plan["metadatas"][j] for j in changed],
+                    documents=[batch_texts[j] for j in changed]
+                )
+                self._notify_write([batch_ids[j] for j in changed], [batch_texts[j] for j in changed])
+            for state, count in count_status(plan["status"]).items():
+                counts[state] += count
+        return counts
+
     #Json format
     def save_to_vector_db(self, data: Dict[str, Any]) -> str:
         story_id = str(data['id'])  # Ensure ID is a string
         metadata = self.clean_metadata(data['metadata'])
         text = metadata.pop('text', '')  # Remove 'text' from metadata and store it separately
         
-        # Generate embedding using Solar LLM
-        embedding = self.solar.embed_document(text)
-        
-        self.collection.add(
-            ids=[story_id],
-            embeddings=[embedding],
-            metadatas=[metadata],
-            documents=[text]
-        )
+        # Skips the embedding call and the write when the stored story is identical
+        self.write_documents([story_id], [metadata], [text])
+        self.write_promoted_duplicates()
         
         return story_id
     #Multiple ids of Json
     def save_multiple_to_vector_db(self, data_list: List[Dict[str, Any]]) -> List[str]:
-        ids = []
-        embeddings = []
-        metadatas = []
-        documents = []
-
-        for data in data_list:
-            story_id = str(data['id'])  # Ensure ID is a string
-            metadata = self.clean_metadata(data['metadata'])
-            text = metadata.pop('text', '')  # Remove 'text' from metadata and store it separately
-            
-            # Generate embedding using Solar LLM
-            embedding = self.solar.embed_document(text)
-            
-            ids.append(story_id)
-            embeddings.append(embedding)
-            metadatas.append(metadata)
-            documents.append(text)
-
-        # Save in batches to handle large datasets
-        batch_size = 100
-        for i in range(0, len(ids), batch_size):
-            batch_ids = ids[i:i+batch_size]
-            batch_embeddings = embeddings[i:i+batch_size]
-            batch_metadatas = metadatas[i:i+batch_size]
-            batch_documents = documents[i:i+batch_size]
-            
-            self.collection.add(
-                ids=batch_ids,
-                embeddings=batch_embeddings,
-                metadatas=batch_metadatas,
-                documents=batch_documents
-            )
-        
-        return ids
+        """Save a list of stories; embeddings are computed and written batch by batch."""
+        report = IngestionPipeline(self, collect_ids=True).run(data_list)
+        return report["ids"]
+
+    def ingest(self, records: Iterable[Dict[str, Any]], checkpoint_name: Optional[str] = None, **options) -> Dict[str, Any]:
+        """
+        Stream records into the collection through the ingestion pipeline.
+
+        :param records: Any iterable of story dicts, consumed lazily
+        :param checkpoint_name: Name of the resume checkpoint; reruns with the same name skip committed records
+        :param options: batch_size, queue_size, embed_workers, report_every and checkpoint_interval for IngestionPipeline
+        :return: Progress report with counts, docs/sec, embeddings/sec and write latency
+        """
+        checkpoint_path = None
+        if checkpoint_name:
+            checkpoint_path = os.path.join(self.checkpoint_directory, f"{checkpoint_name}.json")
+        return IngestionPipeline(self, checkpoint_path=checkpoint_path, **options).run(records)
     
     #pdf file processing
+    def _pdf_executor(self) -> ProcessPoolExecutor:
+        # Started on first use so importing the module never starts workers. They are spawned
+        # rather than forked because this process already runs threads (executors, Chroma)
+        with self._pdf_lock:
+            if self.pdf_executor is None:
+                self.pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(self.pdf_executor.shutdown)
+            return self.pdf_executor
+
+    def iter_pdf_chunks(self, pdf_path: str) -> Iterator[Tuple[str, int, int]]:
+        """Yield (chunk, first page, last page); pages are extracted in worker processes."""
+        pages = iter_pages(pdf_path, self._pdf_executor(), PDF_PAGES_PER_TASK, PDF_WORKERS)
+        return iter_chunks(pages, self.text_splitter)
+
     def process_pdf(self, pdf_path: str) -> List[str]:
         """Process a PDF file and return a list of text chunks."""
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        
-        return self.text_splitter.split_text(text)
+        return [chunk for chunk, _, _ in self.iter_pdf_chunks(pdf_path)]
     
 
     #save pdf into vector db
-    def save_pdf_to_vector_db(self, pdf_path: str) -> List[str]:
-        """Process a PDF and save its chunks to Chroma DB."""
-        chunks = self.process_pdf(pdf_path)
-        ids = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{os.path.basename(pdf_path)}_{i}"
-            metadata = {
-                "source": pdf_path,
-                "chunk": i,
-                "type": "pdf"
-            }
-            embedding = self.solar.embed_document(chunk)
-            
-            self.collection.add(
-                ids=[chunk_id],
-                embeddings=[embedding],
-                metadatas=[self.clean_metadata(metadata)],
-                documents=[chunk]
-            )
-            ids.append(chunk_id)
+    def save_pdf_to_vector_db(self, pdf_path: str, batch_size: int = 100) -> List[str]:
+        """
+        Process a PDF and save its chunks to Chroma DB; re-saving an unchanged PDF writes nothing.
+        Chunks are embedded and written in batches and carry the pages they come from.
+        """
+        # The path digest keeps PDFs that share a file name in different folders apart
+        path_digest = hashlib.sha1(os.path.abspath(pdf_path).encode("utf-8")).hexdigest()[:8]
+        ids, counts = [], {"new": 0, "updated": 0, "unchanged": 0, "duplicate": 0}
+        batch_ids, batch_metadatas, batch_chunks = [], [], []
+
+        def write_batch():
+            for state, count in self.write_documents(batch_ids, batch_metadatas, batch_chunks, batch_size).items():
+                counts[state] += count
+            for batch in (batch_ids, batch_metadatas, batch_chunks):
+                batch.clear()
+
+        for i, (chunk, first_page, last_page) in enumerate(self.iter_pdf_chunks(pdf_path)):
+            ids.append(f"{os.path.basename(pdf_path)}_{path_digest}_{i}")
+            batch_ids.append(ids[-1])
+            batch_metadatas.append(self.clean_metadata(
+                {"source": pdf_path, "chunk": i, "type": "pdf", "page": first_page, "page_end": last_page}
+            ))
+            batch_chunks.append(chunk)
+            if len(batch_ids) >= batch_size:
+                write_batch()
+        if batch_ids:
+            write_batch()
+
+        # Chunks left over from a longer earlier version (or the old id scheme) are removed
+        current = set(ids)
+        stale = [doc_id for doc_id in self.collection.get(where={"source": pdf_path}, include=[])['ids'] if doc_id not in current]
+        if stale:
+            self.collection.delete(ids=stale)
+            self.keyword_index.delete_documents(stale)
+            if self.near_duplicates is not None:
+                self.near_duplicates.remove(stale)
+            self._notify_write(stale)
+        self.write_promoted_duplicates()
+        self.keyword_index.flush()
+        if self.near_duplicates is not None:
+            self.near_duplicates.flush()
+        logger.info(f"Saved {pdf_path}: {counts['new']} new, {counts['updated']} updated, "
+                    f"{counts['unchanged']} unchanged, {counts['duplicate']} near-duplicates, {len(stale)} stale chunks removed")
         
         return ids
 
     #save multiple_pdfs to vector_db
     def save_multiple_pdfs_to_vector_db(self, pdf_paths: List[str]) -> List[str]:
-        """Process multiple PDFs and save their chunks to Chroma DB."""
+        """Process multiple PDFs and save their chunks to Chroma DB, several files at a time."""
         all_ids = []
-        for pdf_path in pdf_paths:
-            ids = self.save_pdf_to_vector_db(pdf_path)
-            all_ids.extend(ids)
+        with ThreadPoolExecutor(max_workers=PDF_CONCURRENCY, thread_name_prefix="pdf") as executor:
+            for ids in executor.map(self.save_pdf_to_vector_db, pdf_paths):
+                all_ids.extend(ids)
         return all_ids
 
-    def query_vector_db(self, query_text: str, n_results: int = 5, filter_condition: Dict[str, Any] = None) -> Dict[str, Any]:
+    def query_vector_db(self, query_text: str, n_results: int = 5, filter_condition: Dict[str, Any] = None,
+                        time_window_days: Optional[int] = None) -> Dict[str, Any]:
         query_embedding = self.solar.embed_query(query_text)
         results = self.collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results,
-            where=filter_condition,
+            where=self.time_window_filter(time_window_days, filter_condition),
             include=["documents", "metadatas", "distances"]
         )
         return results
@@ -147,89 +526,62 @@ class VectorDB:
         sample_ids = self.collection.get(limit=5)['ids']
         return {
             "total_items": total_items,
-            "sample_ids": sample_ids
-        }
-    def verify_data_storage(self, data_list: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Verify that data from data.json has been correctly stored in Chroma DB."""
-        verification_results = {
-            "success": True,
-            "message": "All data verified successfully",
-            "total_stories": len(data_list),
-            "verified_stories": 0,
-            "mismatches": []
+            "sample_ids": sample_ids,
+            "index_settings": self.collection_metadata
         }
+    def verify_data_storage(self, data_list: Iterable[Dict[str, Any]], batch_size: int = 500, workers: int = 4,
+                            check_embeddings: bool = False) -> Dict[str, Any]:
+        """
+        Verify that data from data.json has been correctly stored in Chroma DB.
 
-        for data in data_list:
-            story_id = str(data['id'])  # Ensure ID is a string
-            original_metadata = self.clean_metadata(data['metadata'].copy())
-            original_text = original_metadata.pop('text', '')
-
-            # Fetch the stored data
-            try:
-                stored_data = self.collection.get(
-                    ids=[story_id],
-                    include=['documents', 'metadatas']
-                )
-
-                if not stored_data['ids']:
-                    verification_results["mismatches"].append({
-                        "id": story_id,
-                        "error": "Story not found in database"
-                    })
-                    continue
-
-                stored_metadata = stored_data['metadatas'][0]
-                stored_text = stored_data['documents'][0]
-
-                # Compare metadata
-                if original_metadata != stored_metadata:
-                    verification_results["mismatches"].append({
-                        "id": story_id,
-                        "error": "Metadata mismatch",
-                        "original": original_metadata,
-                        "stored": stored_metadata
-                    })
-
-                # Compare text
-                if original_text != stored_text:
-                    verification_results["mismatches"].append({
-                        "id": story_id,
-                        "error": "Text mismatch",
-                        "original_preview": original_text[:100],
-                        "stored_preview": stored_text[:100]
-                    })
-
-                verification_results["verified_stories"] += 1
-
-            except Exception as e:
-                verification_results["mismatches"].append({
-                    "id": story_id,
-                    "error": f"Error during verification: {str(e)}"
-                })
-
-        if verification_results["mismatches"]:
-            verification_results["success"] = False
-            verification_results["message"] = f"Verification completed with {len(verification_results['mismatches'])} mismatches"
-
-        return verification_results
+        :param data_list: Any iterable of story dicts, e.g. iter_json_data() for large files
+        :param check_embeddings: Also compare stored vectors with the cached embedding of the same text
+        :return: Mismatch counts by error, the first mismatches, and throughput
+        """
+        verifier = StorageVerifier(self, batch_size=batch_size, workers=workers, check_embeddings=check_embeddings,
+                                   embedding_model=PASSAGE_EMBEDDING_MODEL)
+        return verifier.run(data_list)
 
 
     @staticmethod
     def load_json_data(file_path: str) -> List[Dict[str, Any]]:
         with open(file_path, 'r') as file:
             return json.load(file)
+
+    @staticmethod
+    def iter_json_data(file_path: str) -> Iterator[Dict[str, Any]]:
+        """Lazily yield records from a JSON array or NDJSON file without loading it whole."""
+        return iter_json_records(file_path)
         
     @staticmethod
-    def sample_json_data(data: List[Dict[str, Any]], sample_size: int) -> List[Dict[str, Any]]:
+    def sample_json_data(data: Iterable[Dict[str, Any]], sample_size: int) -> List[Dict[str, Any]]:
         """
         Sample a subset of the JSON data.
         
-        :param data: The full list of data items
+        :param data: The full list of data items, or a stream of them (e.g. from iter_json_data)
         :param sample_size: The number of items to sample
         :return: A list containing the sampled items
         """
-        return random.sample(data, min(sample_size, len(data)))
+        if isinstance(data, list):
+            return random.sample(data, min(sample_size, len(data)))
+        return reservoir_sample(data, sample_size)
+
+    def ingest_json_file(self, file_path: str, sample_size: Optional[int] = None,
+                         checkpoint_name: Optional[str] = None, **options) -> Dict[str, Any]:
+        """
+        Stream a JSON array or NDJSON file straight into the ingestion pipeline.
+
+        :param file_path: Path of the dataset
+        :param sample_size: Ingest only a reservoir sample of this many records
+        :param checkpoint_name: Resume checkpoint name (ignored when sampling, as samples differ per run)
+        :return: Ingestion report
+        """
+        records = self.iter_json_data(file_path)
+        if sample_size is not None:
+            return self.ingest(self.sample_json_data(records, sample_size), **options)
+        return self.ingest(records, checkpoint_name=checkpoint_name, **options)
 
 
 # # Create an instance of VectorDB
-vector_db = VectorDB()
\ No newline at end of file
+# Not built in PDF extraction workers, which re-import the parent's __main__ (see is_worker_bootstrap)
+vector_db = VectorDB() if not is_worker_bootstrap() else None
@@ -0,0 +1,133 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+
+from database.content_hash import HASH_KEYS, content_hash, record_hash
+
+logger = logging.getLogger(__name__)
+
+
+class StorageVerifier:
+    """
+    Bulk check that input records are stored as given.
+
+    Records are compared in batches of `batch_size` ids, one collection.get per batch, with up
+    to `workers` batches in flight. Stored documents written since content hashing carry their
+    record hash, so only hashes are compared; older ones fall back to comparing text and
+    metadata. Records kept only as near-duplicate references count as verified. With
+    `check_embeddings`, stored vectors are compared with the embedding cache entry for the
+    same text (cosine similarity below `embedding_tolerance` is a mismatch).
+    """
+
+    def __init__(self, vector_db, batch_size: int = 500, workers: int = 4, check_embeddings: bool = False,
+                 embedding_model: Optional[str] = None, embedding_tolerance: float = 0.999, max_reported: int = 100):
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+        self.workers = workers
+        self.check_embeddings = check_embeddings
+        self.embedding_model = embedding_model
+        self.embedding_tolerance = embedding_tolerance
+        self.max_reported = max_reported
+
+    def _batches(self, records: Iterable[Dict[str, Any]]):
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield [self.vector_db.split_record(data) for data in batch]
+
+    def verify_batch(self, batch: List) -> Dict[str, Any]:
+        """Return {"checked": n, "mismatches": [...], "unverifiable_embeddings": n} for one batch."""
+        ids = [story_id for story_id, _, _ in batch]
+        include = ['metadatas', 'embeddings'] if self.check_embeddings else ['metadatas']
+        stored = self.vector_db.collection.get(ids=ids, include=include)
+        stored_embeddings = stored.get('embeddings') if self.check_embeddings else None
+        found = {doc_id: i for i, doc_id in enumerate(stored['ids'])}
+        mismatches, legacy, unverifiable = [], [], 0
+        near_duplicates = self.vector_db.near_duplicates
+
+        for story_id, metadata, text in batch:
+            if story_id not in found:
+                if near_duplicates is not None and near_duplicates.canonical_of(story_id) != story_id:
+                    continue
+                mismatches.append({"id": story_id, "error": "Missing"})
+                continue
+            stored_metadata = stored['metadatas'][found[story_id]] or {}
+            if "record_hash" not in stored_metadata:
+                legacy.append((story_id, metadata, text))
+            elif stored_metadata["record_hash"] != record_hash(text, metadata):
+                error = "Text mismatch" if stored_metadata.get("content_hash") != content_hash(text) else "Metadata mismatch"
+                mismatches.append({"id": story_id, "error": error})
+            if self.check_embeddings:
+                cached = self.vector_db.solar.embedding_cache.get(self.embedding_model, text)
+                if cached is None:
+                    unverifiable += 1
+                elif self._similarity(cached, stored_embeddings[found[story_id]]) < self.embedding_tolerance:
+                    mismatches.append({"id": story_id, "error": "Embedding mismatch"})
+
+        if legacy:
+            # Written before hashes were stored: compare the full content once
+            documents = self.vector_db.collection.get(ids=[story_id for story_id, _, _ in legacy], include=['documents', 'metadatas'])
+            by_id = dict(zip(documents['ids'], zip(documents['documents'], documents['metadatas'])))
+            for story_id, metadata, text in legacy:
+                stored_text, stored_metadata = by_id.get(story_id, (None, {}))
+                stored_metadata = {key: value for key, value in (stored_metadata or {}).items() if key not in HASH_KEYS}
+                if stored_text != text:
+                    mismatches.append({"id": story_id, "error": "Text mismatch"})
+                elif stored_metadata != metadata:
+                    mismatches.append({"id": story_id, "error": "Metadata mismatch"})
+        return {"checked": len(batch), "mismatches": mismatches, "unverifiable_embeddings": unverifiable}
+
+    @staticmethod
+    def _similarity(a, b) -> float:
+        a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+        return float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-12))
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        checked, unverifiable, mismatch_count, mismatched_ids = 0, 0, 0, 0
+        reported, by_error = [], {}
+
+        def collect(result):
+            nonlocal checked, unverifiable, mismatch_count, mismatched_ids
+            checked += result["checked"]
+            unverifiable += result["unverifiable_embeddings"]
+            mismatch_count += len(result["mismatches"])
+            mismatched_ids += len({mismatch["id"] for mismatch in result["mismatches"]})
+            for mismatch in result["mismatches"]:
+                by_error[mismatch["error"]] = by_error.get(mismatch["error"], 0) + 1
+                if len(reported) < self.max_reported:
+                    reported.append(mismatch)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="verify") as executor:
+            in_flight = []
+            for batch in self._batches(records):
+                in_flight.append(executor.submit(self.verify_batch, batch))
+                # Bound the batches held in memory when the input is a long stream
+                if len(in_flight) >= 2 * self.workers:
+                    collect(in_flight.pop(0).result())
+            for future in in_flight:
+                collect(future.result())
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "success": mismatch_count == 0,
+            "message": "All data verified successfully" if mismatch_count == 0
+            else f"Verification completed with {mismatch_count} mismatches",
+            "total_stories": checked,
+            "verified_stories": checked - mismatched_ids,
+            "mismatch_counts": by_error,
+            "mismatches": reported,
+            "elapsed_seconds": elapsed,
+            "stories_per_second": checked / elapsed if elapsed > 0 else 0.0
+        }
+        if self.check_embeddings:
+            report["unverifiable_embeddings"] = unverifiable
+        logger.info(f"Verified {checked} stories in {elapsed:.1f}s ({report['stories_per_second']:.0f}/s), "
+                    f"{mismatch_count} mismatches")
+        return report
@@ -1,120 +1,108 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
-def getLatestCyberSecurityNews(k=5):
-    def TheHackerNewsSearch():
-        HTMLData = requests.get("https://thehackernews.com/")
-        soup = BeautifulSoup(HTMLData.text, 'html.parser')
-        elements = soup.find_all(class_="body-post clear")
-        news_list = []
-        for body_post in elements:
-            story_link = body_post.select_one('.story-link')
-            href = story_link.get('href')
-            data = requests.get(href)
-            info = BeautifulSoup(data.text, 'html.parser')
-            header = info.select_one('.story-title')
-            content = info.find_all(['p','h2'])
-            content = content[:-8]
-            content = [element for element in content if not (element.name == 'p' and element.find('em'))]
-            content = "\n".join(["**" + i.text + "**" if i.name == 'h2' else i.text for i in content])
-            date = info.select_one('.author')
-            date = datetime.strptime(date.text, "%b %d, %Y").date()
-            news = {
-                'Name': header.text,
-                'Content': content,
-                'Date': date,
-                'Ref': href,
-            }
-            news_list.append(news)
-        return news_list
-
-    def DarkReadingSearch():
-        def find_date_indices(text_list):
-          for index, text in enumerate(text_list):
-              try:
-                  datetime.strptime(text, "%B %d, %Y")
-                  return index
-              except ValueError:
-                  continue
-          return None
-        def find_space_indices(text_list):
-          for index, text in enumerate(text_list):
-              if text == "**About the Author**" or text == "Read more about:":
-                  return index
-          return None
-        HTMLData = requests.get("https://www.darkreading.com/")
-        soup = BeautifulSoup(HTMLData.text, 'html.parser')
-        elements = soup.find_all(class_='ContentPreview LatestFeatured-ContentItem LatestFeatured-ContentItem_left')
-        news_list = []
-        for body_post in elements:
-            story_link = body_post.select_one('.ListPreview-Title')
-            href = "https://www.darkreading.com"+story_link.get('href')
-            data = requests.get(href)
-            info = BeautifulSoup(data.text, 'html.parser')
-            header = info.select_one('.ArticleBase-LargeTitle')
-            content = info.find_all(['p', 'h2'])
-            content = ["**" + i.text + "**" if i.name == 'h2' else i.text for i in content]
-            date_index = find_date_indices(content)
-            space_index = find_space_indices(content)
-            date = datetime.strptime(content[date_index], "%B %d, %Y").date()
-            content = content[date_index+1:space_index]
-            news = {
-                'Name': header.text,
-                'Content': "\n".join(content),
-                'Date': date,
-                'Ref': href,
-            }
-            news_list.append(news)
-        return news_list
-
-    def SecurityAffairsSearch():
-        def find_split_indices(text_list):
-            for index, text in enumerate(text_list):
-                if text.strip().replace('\u00A0', ' ') == "Follow me on Twitter: @securityaffairs and Facebook and Mastodon":
-                    return index
+from database.content_hash import content_hash
+from services.article_store import ArticleStore
+from services.news_extractors import SOURCES
+from services.news_refresher import NewsRefresher
+from utils.http_client import PooledHTTPClient
+
+logger = logging.getLogger(__name__)
+
+NEWS_FETCH_WORKERS = int(os.getenv("WOLFARE_NEWS_FETCH_WORKERS", "12"))
+NEWS_MAX_PER_HOST = int(os.getenv("WOLFARE_NEWS_MAX_PER_HOST", "4"))
+NEWS_RETRIES = int(os.getenv("WOLFARE_NEWS_RETRIES", "3"))
+NEWS_CONNECT_TIMEOUT = float(os.getenv("WOLFARE_NEWS_CONNECT_TIMEOUT", "5"))
+NEWS_READ_TIMEOUT = float(os.getenv("WOLFARE_NEWS_READ_TIMEOUT", "20"))
+# Articles summarized per refresh and parallel LLM requests while summarizing them
+NEWS_DIGEST_SIZE = int(os.getenv("WOLFARE_NEWS_DIGEST_SIZE", "5"))
+NEWS_SUMMARY_CONCURRENCY = int(os.getenv("WOLFARE_NEWS_SUMMARY_CONCURRENCY", "4"))
+NEWS_SUMMARY_MODEL = os.getenv("WOLFARE_NEWS_SUMMARY_MODEL", "gpt-4o")
+NEWS_REFRESH_SECONDS = float(os.getenv("WOLFARE_NEWS_REFRESH_SECONDS", "3600"))
+NEWS_RETRY_SECONDS = float(os.getenv("WOLFARE_NEWS_RETRY_SECONDS", "300"))
+# Published articles rarely change: stored ones are served without a request for this long,
+# then revalidated with a conditional GET
+ARTICLE_REVALIDATE_SECONDS = float(os.getenv("WOLFARE_ARTICLE_REVALIDATE_SECONDS", "86400"))
+ARTICLE_STORE_PATH = os.getenv(
+    "WOLFARE_ARTICLE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'news_articles.sqlite3')
+)
+
+# Shared by every scraper: pooled keep-alive connections, timeouts, retries and per-host limits
+http_client = PooledHTTPClient(
+    timeout=(NEWS_CONNECT_TIMEOUT, NEWS_READ_TIMEOUT), max_per_host=NEWS_MAX_PER_HOST,
+    retries=NEWS_RETRIES, pool_size=max(NEWS_FETCH_WORKERS, NEWS_MAX_PER_HOST)
+)
+article_executor = ThreadPoolExecutor(max_workers=NEWS_FETCH_WORKERS, thread_name_prefix="news-article")
+article_store = ArticleStore(ARTICLE_STORE_PATH)
+
+
+def fetch_articles(hrefs, parse):
+    """
+    Download and parse article pages concurrently. `parse(href, html)` is one of the article
+    extractors in services.news_extractors and returns the news dict; articles that fail to
+    download or parse are logged and skipped. Input order is kept.
+
+    Articles already in article_store are not parsed again: recently checked ones are served
+    from the store, older ones are revalidated with a conditional GET and only re-parsed when
+    the server sends a different body.
+    """
+    def fetch(href):
+        try:
+            stored = article_store.get(href)
+            if stored is not None and time.time() - stored["checked_at"] < ARTICLE_REVALIDATE_SECONDS:
+                article_store.record("fresh")
+                return stored["news"]
+            response = http_client.get(href, headers=article_store.conditional_headers(stored))
+            etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            if stored is not None and response.status_code == 304:
+                article_store.touch(href, etag, last_modified)
+                article_store.record("not_modified")
+                return stored["news"]
+            body_hash = article_store.body_hash(response.content)
+            if stored is not None and stored["body_hash"] == body_hash:
+                article_store.touch(href, etag, last_modified)
+                article_store.record("unchanged")
+                return stored["news"]
+            news = parse(href, response.text)
+            article_store.put(href, news, etag, last_modified, body_hash)
+            article_store.record("parsed")
+            return news
+        except Exception as e:
+            logger.error(f"Error fetching article {href}: {e}")
             return None
-        HTMLData = requests.get("https://securityaffairs.com/category/cyber-crime")
-        soup = BeautifulSoup(HTMLData.text, 'html.parser')
-        elements = soup.find_all(class_='news-card news-card-category mb-3 mb-lg-5')
-        news_list = []
-        for body_post in elements:
-            story_link = body_post.select_one('a')
-            href = story_link.get('href')
-            data = requests.get(href)
-            info = BeautifulSoup(data.text, 'html.parser')
-            content = info.find('div', class_="article-details-block wow fadeInUp")
-            content = content.find_all(['p', 'h2'])
-            content = ["**" + i.text + "**" if i.name == 'h2' else i.text for i in content]
-            header = content[0]
-            split_index = find_split_indices(content)
-            content = content[1:split_index]
-            date = info.select(".post-time.mb-3")
-            date = date[0]
-            date = date.select('span')
-            date = date[1].text
-            date = datetime.strptime(date, " %B %d, %Y").date()
-            news = {
-                'Name': header,
-                'Content': "\n".join(content),
-                'Date': date,
-                'Ref': href,
-            }
-            news_list.append(news)
-        return news_list
-
-    news_list = TheHackerNewsSearch() + DarkReadingSearch() + SecurityAffairsSearch()
+
+    return [news for news in article_executor.map(fetch, hrefs) if news is not None]
+
+
+def getLatestCyberSecurityNews(k=5):
+    def search(source):
+        url, links, article = SOURCES[source]
+        try:
+            return fetch_articles(links(http_client.get(url).text), article)
+        except Exception as e:
+            logger.error(f"Error searching {source}: {e}")
+            return []
+
+    # The sites are scraped at the same time; their article pages share article_executor
+    with ThreadPoolExecutor(max_workers=len(SOURCES), thread_name_prefix="news-site") as executor:
+        results = list(executor.map(search, SOURCES))
+    news_list = [news for result in results for news in result]
     sorted_news_list = sorted(news_list, key=lambda news: news['Date'], reverse=True)
     sorted_news_list = sorted_news_list[:k]
 
     return sorted_news_list
 
-def getLatestNews():
-    x = getLatestCyberSecurityNews(k=1)
+@lru_cache(maxsize=1)
+def summaryChain():
     messages = ChatPromptTemplate.from_messages(
     [
         ("system", "You are an AI assistant specialized in analyzing and summarizing cybersecurity news and discussions from Hacker News. Your goal is to provide concise yet comprehensive summaries that help cybersecurity professionals quickly understand key threats, vulnerabilities, tools manual and industry trends."),
@@ -169,17 +157,52 @@ Hacker News content to analyze:
 """)
 ])
     parser = StrOutputParser()
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.5)
-    chain = {"text": RunnablePassthrough()} | messages | llm | parser
-    return chain.invoke(x[0]) # Change the number of content here
-
-current_datetime = datetime.now()
-temp_date = current_datetime.strftime("%d-%m-%Y")
-fetched_news = getLatestNews()
-def getLastestWithDate(last_update):
-    global temp_date
-    global fetched_news
-    if temp_date != last_update:
-        temp_date = last_update
-        fetched_news = getLatestNews()
-    return temp_date, fetched_news
\ No newline at end of file
+    llm = ChatOpenAI(model=NEWS_SUMMARY_MODEL, temperature=0.5)
+    return {"text": RunnablePassthrough()} | messages | llm | parser
+
+def summarizeArticles(articles):
+    """
+    Summaries for the given articles as digest entries, in input order. Summaries are stored per
+    (URL, content hash), so only new or edited articles reach the LLM; those are summarized
+    together with chain.batch, at most NEWS_SUMMARY_CONCURRENCY requests at a time. Articles
+    whose summary fails are logged and left out.
+    """
+    keys = [(news['Ref'], content_hash(news['Content'])) for news in articles]
+    summaries = dict(zip(keys, article_store.get_summaries(keys, NEWS_SUMMARY_MODEL)))
+    pending = {key: news for key, news in zip(keys, articles) if summaries[key] is None}
+    if pending:
+        results = summaryChain().batch(list(pending.values()), config={"max_concurrency": NEWS_SUMMARY_CONCURRENCY},
+                                       return_exceptions=True)
+        stored = []
+        for key, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error summarizing {key[0]}: {result}")
+                continue
+            summaries[key] = result
+            stored.append((*key, result))
+        article_store.put_summaries(stored, NEWS_SUMMARY_MODEL)
+        logger.info(f"Summarized {len(stored)} of {len(pending)} new articles, {len(articles) - len(pending)} reused")
+    return [{'Name': news['Name'], 'Date': news['Date'].isoformat(), 'Ref': news['Ref'], 'Summary': summaries[key]}
+            for key, news in zip(keys, articles) if summaries[key] is not None]
+
+def getLatestNews():
+    """Digest of the NEWS_DIGEST_SIZE newest articles; raises when nothing could be summarized."""
+    articles = getLatestCyberSecurityNews(k=NEWS_DIGEST_SIZE)
+    digest = summarizeArticles(articles)
+    if not digest:
+        raise RuntimeError(f"No article could be summarized ({len(articles)} fetched)")
+    return digest
+
+# Refreshed in the background by the API server; nothing is scraped or summarized at import
+news_refresher = NewsRefresher(getLatestNews, interval_seconds=NEWS_REFRESH_SECONDS, retry_seconds=NEWS_RETRY_SECONDS)
+
+
+def getLatestSnapshot():
+    """Last good news result with its age; never blocks on a refresh."""
+    snapshot = news_refresher.snapshot()
+    digest = snapshot.pop("output") or []
+    # "output" keeps its old meaning, the summary of the newest article; "digest" has all of them
+    snapshot["output"] = digest[0]['Summary'] if digest else None
+    snapshot["digest"] = digest
+    snapshot["date"] = datetime.fromisoformat(snapshot["updated_at"]).strftime("%d-%m-%Y") if snapshot["updated_at"] else None
+    return snapshot
@@ -1,7 +1,8 @@
 #from src.pages import wolfare_controller
 from utils.config import load_environment_variables
 from database.vector_db import vector_db
-from services.chat import solar_hn
+from services.chat import solar_hn, DEFAULT_PROFILE, TIME_WINDOW_DAYS
+from typing import Optional
 import logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -70,5 +71,30 @@ def main(prompt: str):
 
     return f'{e}', result["answer"], f"\nConfidence: {result['confidence']:.2f}"
 
+async def amain(prompt: str, profile: str = DEFAULT_PROFILE, time_window_days: Optional[int] = TIME_WINDOW_DAYS):
+    """
+    Async counterpart of main() used by the API server so queries never block the event loop.
+    Also returns the request id under which a balanced query's scores can be fetched later.
+    """
+    load_environment_variables()
+    e = ""
+    query = prompt.strip()
+    result = {"answer": "", "references": [], "confidence": 0.0}
+
+    try:
+        result = await solar_hn.aprocess_query(query, vector_db, profile, time_window_days)
+        logger.debug(f"Answer: {result['answer']}")
+    except Exception as err:
+        e = err
+        logger.error(f"Error processing query: {e}")
+
+    return f'{e}', result["answer"], f"\nConfidence: {result['confidence']:.2f}", result.get("request_id")
+
+async def astream(prompt: str, profile: str = DEFAULT_PROFILE, time_window_days: Optional[int] = TIME_WINDOW_DAYS):
+    """Yield server-sent events for a prompt: answer tokens first, then the quality scores."""
+    load_environment_variables()
+    async for event in solar_hn.astream_query(prompt.strip(), vector_db, profile, time_window_days):
+        yield event
+
 # if __name__ == "__main__":
 #     main()
\ No newline at end of file
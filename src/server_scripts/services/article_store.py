@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleStore:
+    """
+    Parsed news articles keyed by URL, in a SQLite file.
+
+    Each row keeps the extracted Name/Content/Date, the HTTP validators (ETag, Last-Modified)
+    and a digest of the downloaded body. The scraper uses them to send conditional GETs and to
+    skip parsing when an article comes back unchanged, so only new articles are parsed.
+    LLM summaries are kept in a second table keyed by (URL, content hash, model), so an article
+    is summarized once per version of its text.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.counts = {"fresh": 0, "not_modified": 0, "unchanged": 0, "parsed": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "url TEXT PRIMARY KEY, name TEXT NOT NULL, content TEXT NOT NULL, date TEXT NOT NULL, "
+            "etag TEXT, last_modified TEXT, body_hash TEXT, checked_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "url TEXT NOT NULL, content_hash TEXT NOT NULL, model TEXT NOT NULL, summary TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (url, content_hash, model))"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def body_hash(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Stored entry as {"news", "etag", "last_modified", "body_hash", "checked_at"}, or None."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT name, content, date, etag, last_modified, body_hash, checked_at FROM articles WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        name, content, published, etag, last_modified, body_hash, checked_at = row
+        return {
+            "news": {'Name': name, 'Content': content, 'Date': date.fromisoformat(published), 'Ref': url},
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_hash": body_hash,
+            "checked_at": checked_at
+        }
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, news: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None,
+            body_hash: Optional[str] = None):
+        with self._lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO articles (url, name, content, date, etag, last_modified, body_hash, checked_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, news['Name'], news['Content'], news['Date'].isoformat(), etag, last_modified, body_hash, time.time())
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to store article {url}: {e}")
+
+    def touch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Record that the stored article was revalidated, keeping previous validators the server did not resend."""
+        with self._lock:
+            try:
+                self.connection.execute(
+                    "UPDATE articles SET checked_at = ?, etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (time.time(), etag, last_modified, url)
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to update article {url}: {e}")
+
+    def get_summaries(self, keys: Sequence[Tuple[str, str]], model: str) -> List[Optional[str]]:
+        """Stored summaries for (url, content hash) keys in input order, None where there is none."""
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                row = self.connection.execute(
+                    "SELECT summary FROM summaries WHERE url = ? AND content_hash = ? AND model = ?", (*key, model)
+                ).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+        return [found.get(key) for key in keys]
+
+    def put_summaries(self, items: Sequence[Tuple[str, str, str]], model: str):
+        """Store (url, content hash, summary) items."""
+        with self._lock:
+            try:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO summaries (url, content_hash, model, summary, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [(url, digest, model, summary, time.time()) for url, digest, summary in items]
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to store summaries: {e}")
+
+    def record(self, outcome: str):
+        """Count how an article was served: "fresh", "not_modified", "unchanged" or "parsed"."""
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stored = self.connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            summaries = self.connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            return dict(self.counts, stored_articles=stored, stored_summaries=summaries)
@@ -1,15 +1,78 @@
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+import asyncio
+import functools
+import time
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Callable, AsyncIterator, Iterator, Tuple, TypedDict, Annotated, Optional
+from openai import OpenAI, AsyncOpenAI
 import json
 import re
 import logging
-from langgraph.graph import Graph, END
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableLambda
+from services.streaming import JSONFieldStream
+from services.response_cache import SemanticResponseCache
+from services.embedding_cache import EmbeddingCache
+from services.ranking import rerank, merge_query_results
+from utils.config import is_worker_bootstrap
 #from langgraph.prebuilt import ToolExecutor
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+
+def _join_errors(current: str, new: str) -> str:
+    # Parallel branches may both fail in the same step; keep every message, in step order
+    return "; ".join(error for error in (current, new) if error)
+
+
+class RAGState(TypedDict, total=False):
+    query: str
+    vector_db: Any
+    analysis: Dict[str, Any]
+    query_embedding: List[float]
+    time_window_days: Optional[int]
+    search_results: List[Dict[str, Any]]
+    response: Dict[str, Any]
+    groundedness: Dict[str, Any]
+    evaluation: Dict[str, Any]
+    error: Annotated[str, _join_errors]
+
+# fast: retrieval + generation only; balanced: answer first, quality scores computed in the
+# background and fetched later by request id; audited: every stage before returning
+PIPELINE_PROFILES = ("fast", "balanced", "audited")
+DEFAULT_PROFILE = os.getenv("WOLFARE_DEFAULT_PROFILE", "audited")
+
+QUERY_EMBEDDING_MODEL = "solar-embedding-1-large-query"
+PASSAGE_EMBEDDING_MODEL = "solar-embedding-1-large-passage"
+# Provider limits for one embeddings request; tokens are estimated at ~4 characters each
+EMBEDDING_BATCH_SIZE = int(os.getenv("SOLAR_EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("SOLAR_EMBEDDING_BATCH_TOKENS", "200000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("SOLAR_EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = 3
+EMBEDDING_CACHE_PATH = os.getenv(
+    "WOLFARE_EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'embedding_cache.sqlite3')
+)
+
+# Hybrid search: candidates per branch, fusion method ("rrf" or "score") and optional MMR lambda
+RETRIEVAL_CANDIDATES = int(os.getenv("WOLFARE_RETRIEVAL_CANDIDATES", "10"))
+FUSION_METHOD = os.getenv("WOLFARE_FUSION", "rrf")
+FUSION_WEIGHTS = {"rrf": (1.0, 1.0), "score": (0.7, 0.3)}  # (semantic, keyword)
+MMR_LAMBDA = float(os.getenv("WOLFARE_MMR_LAMBDA")) if os.getenv("WOLFARE_MMR_LAMBDA") else None
+# Recency: default time window pushed into the Chroma where clause, and the half-life of the
+# exponential decay applied to fused scores (both unset by default)
+TIME_WINDOW_DAYS = int(os.getenv("WOLFARE_TIME_WINDOW_DAYS")) if os.getenv("WOLFARE_TIME_WINDOW_DAYS") else None
+DECAY_HALF_LIFE_DAYS = float(os.getenv("WOLFARE_DECAY_HALF_LIFE_DAYS")) if os.getenv("WOLFARE_DECAY_HALF_LIFE_DAYS") else None
+# Analysis key points searched alongside the query in the same collection.query call (0 disables)
+MULTI_QUERY_KEY_POINTS = int(os.getenv("WOLFARE_MULTI_QUERY_KEY_POINTS", "3"))
+
+GENERATION_FAILED_ANSWER = "Sorry, I couldn't generate a response due to an error."
+
 class SolarHackerNews:
     def __init__(self):
         self.api_key = os.getenv("UPSTAGE_API_KEY")
@@ -19,8 +82,48 @@ class SolarHackerNews:
             api_key=self.api_key,
             base_url="https://api.upstage.ai/v1/solar"
         )
+        # Shared async client so concurrent requests multiplex over one connection pool
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url="https://api.upstage.ai/v1/solar"
+        )
+        # Bounded pool for the blocking calls (Chroma queries) that have no async API
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SOLAR_MAX_WORKERS", "8")),
+            thread_name_prefix="solar"
+        )
+        # Separate pool for batched embedding requests, so a large ingest cannot starve queries
+        self.embedding_executor = ThreadPoolExecutor(
+            max_workers=EMBEDDING_CONCURRENCY,
+            thread_name_prefix="solar-embed"
+        )
+
+        self.graphs = {profile: self.create_rag_graph(profile) for profile in PIPELINE_PROFILES}
+        self.graph = self.graphs["audited"]
 
-        self.graph = self.create_rag_graph()
+        # Deferred quality scores of "balanced" queries, keyed by request id (oldest evicted first)
+        self.evaluations = OrderedDict()
+        self.max_stored_evaluations = int(os.getenv("WOLFARE_MAX_STORED_EVALUATIONS", "1000"))
+        self._evaluations_lock = threading.Lock()
+        self._background_tasks = set()
+
+        # Embeddings are addressed by (model, text hash) and persisted across restarts
+        self.embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_PATH or None,
+            max_memory_entries=int(os.getenv("WOLFARE_EMBEDDING_CACHE_MEMORY", "10000"))
+        )
+
+        # Near-identical questions are answered from here; WOLFARE_CACHE_SIZE=0 disables it
+        self.response_cache = SemanticResponseCache(
+            threshold=float(os.getenv("WOLFARE_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("WOLFARE_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("WOLFARE_CACHE_TTL", "3600"))
+        )
+
+    async def run_sync(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the bounded executor without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
 
     def call_api(self, messages: List[Dict[str, str]], model: str = "solar-1-mini-chat") -> Dict[str, Any]:
         try:
@@ -34,25 +137,178 @@ class SolarHackerNews:
         except Exception as e:
             logger.error(f"Error in API call: {e}")
             return {"error": str(e)}
+
+    async def acall_api(self, messages: List[Dict[str, str]], model: str = "solar-1-mini-chat") -> Dict[str, Any]:
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages
+            )
+            return response.model_dump()
+        except Exception as e:
+            logger.error(f"Error in async API call: {e}")
+            return {"error": str(e)}
     
     
-    def embed_query(self, text: str) -> List[float]:
+    def _embed(self, model: str, text: str) -> List[float]:
+        cached = self.embedding_cache.get(model, text)
+        if cached is not None:
+            return cached
         response = self.client.embeddings.create(
-            model="solar-embedding-1-large-query",
+            model=model,
             input=text
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        self.embedding_cache.put(model, text, embedding)
+        return embedding
 
-    def embed_document(self, text: str) -> List[float]:
-        response = self.client.embeddings.create(
-            model="solar-embedding-1-large-passage",
+    async def _aembed(self, model: str, text: str) -> List[float]:
+        cached = (await self._aget_cached(model, [text]))[0]
+        if cached is not None:
+            return cached
+        response = await self.async_client.embeddings.create(
+            model=model,
             input=text
         )
-        return response.data[0].embedding
-    
-    def analyze_user_query(self, query: str) -> Dict[str, Any]:
-        #logger.debug(f"Analyzing query: {query}")
-        messages = [
+        embedding = response.data[0].embedding
+        self._put_cached_in_background(model, [text], [embedding])
+        return embedding
+
+    async def _aget_cached(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        # Memory hits are answered on the event loop; only the SQLite tier goes to the worker pool
+        embeddings = self.embedding_cache.get_memory(model, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            lookup = functools.partial(self.embedding_cache.get_stored, model, [texts[i] for i in missing])
+            stored = await self.run_sync(lookup) if self.embedding_cache.persistent else lookup()
+            for i, embedding in zip(missing, stored):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _put_cached_in_background(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        # New vectors are served from memory at once; the SQLite insert and commit run on the worker pool
+        self.embedding_cache.put_memory(model, texts, embeddings)
+        if self.embedding_cache.persistent:
+            self.executor.submit(self.embedding_cache.put_stored, model, texts, embeddings)
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    @classmethod
+    def _pack_batches(cls, texts: List[str], batch_size: int, batch_tokens: int) -> List[List[str]]:
+        """Split texts into request-sized batches, bounded both by count and by token budget."""
+        batches, current, current_tokens = [], [], 0
+        for text in texts:
+            tokens = cls._estimate_tokens(text)
+            if current and (len(current) >= batch_size or current_tokens + tokens > batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, model: str, batch: List[str]) -> List[List[float]]:
+        # Each batch is cached as soon as it arrives, so a later batch failing loses no paid-for vectors
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                response = self.client.embeddings.create(model=model, input=batch)
+                vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+                self.embedding_cache.put_many(model, batch, vectors)
+                return vectors
+            except Exception as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}), retry {attempt + 1}/{EMBEDDING_MAX_RETRIES}")
+                time.sleep(2 ** attempt)
+
+    async def _aembed_batch(self, model: str, batch: List[str]) -> List[List[float]]:
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                response = await self.async_client.embeddings.create(model=model, input=batch)
+                vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+                self._put_cached_in_background(model, batch, vectors)
+                return vectors
+            except Exception as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}), retry {attempt + 1}/{EMBEDDING_MAX_RETRIES}")
+                await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def _pending_texts(texts: List[str], embeddings: List[Optional[List[float]]]) -> List[str]:
+        # Cached vectors are filled in directly; each distinct uncached text is embedded once
+        return list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+
+    @staticmethod
+    def _fill_pending(texts: List[str], embeddings: List[Optional[List[float]]], batch: List[str], vectors: List[List[float]]):
+        computed = dict(zip(batch, vectors))
+        for i, text in enumerate(texts):
+            if embeddings[i] is None and text in computed:
+                embeddings[i] = computed[text]
+
+    def embed_documents(self, texts: List[str], model: str = PASSAGE_EMBEDDING_MODEL) -> List[List[float]]:
+        """
+        Embed many texts with as few requests as possible. Texts are packed into provider-sized
+        batches, up to SOLAR_EMBEDDING_CONCURRENCY batches are in flight at once, failed batches
+        are retried on their own, and the result is in input order.
+        """
+        embeddings = self.embedding_cache.get_many(model, texts)
+        pending = self._pending_texts(texts, embeddings)
+        if pending:
+            batches = self._pack_batches(pending, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TOKENS)
+            futures = {self.embedding_executor.submit(self._embed_batch, model, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch, vectors = futures[future], future.result()
+                self._fill_pending(texts, embeddings, batch, vectors)
+        return embeddings
+
+    async def aembed_documents(self, texts: List[str], model: str = PASSAGE_EMBEDDING_MODEL) -> List[List[float]]:
+        embeddings = await self._aget_cached(model, texts)
+        pending = self._pending_texts(texts, embeddings)
+        if pending:
+            semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+            async def run(batch):
+                async with semaphore:
+                    return batch, await self._aembed_batch(model, batch)
+
+            batches = self._pack_batches(pending, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TOKENS)
+            for batch, vectors in await asyncio.gather(*(run(batch) for batch in batches)):
+                self._fill_pending(texts, embeddings, batch, vectors)
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(QUERY_EMBEDDING_MODEL, text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._aembed(QUERY_EMBEDDING_MODEL, text)
+
+    def embed_document(self, text: str) -> List[float]:
+        return self._embed(PASSAGE_EMBEDDING_MODEL, text)
+
+    async def aembed_document(self, text: str) -> List[float]:
+        return await self._aembed(PASSAGE_EMBEDDING_MODEL, text)
+
+    @staticmethod
+    def _extract_json(result: Dict[str, Any], strip_control_chars: bool = False) -> Dict[str, Any]:
+        """Pull the JSON object out of a chat completion; raises ValueError when there is none."""
+        if "choices" not in result or len(result["choices"]) == 0:
+            raise ValueError("Unexpected API response structure")
+        content = result["choices"][0]["message"]["content"]
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if not json_match:
+            raise ValueError("No JSON object found in the response")
+        json_str = json_match.group(0)
+        if strip_control_chars:
+            json_str = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', json_str)
+        return json.loads(json_str)
+
+    @staticmethod
+    def _analysis_messages(query: str) -> List[Dict[str, str]]:
+        return [
             {"role": "system", "content": "You are an intelligent AI assistant specialized in analyzing user queries about Cyber Security-related information."},
             {"role": "user", "content": 
              f"""Analyze the following user query and provide search results:
@@ -71,95 +327,139 @@ class SolarHackerNews:
              """
             }
         ]
+
+    def analyze_user_query(self, query: str) -> Dict[str, Any]:
+        #logger.debug(f"Analyzing query: {query}")
         try:
-            result = self.call_api(messages)
-            if "choices" in result and len(result["choices"]) > 0:
-                content = result["choices"][0]["message"]["content"]
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    analysis = json.loads(json_str)
-                    return analysis
-                else:
-                    logger.error("No JSON object found in the response")
-            else:
-                logger.error("Unexpected API response structure")
+            return self._extract_json(self.call_api(self._analysis_messages(query)))
         except Exception as e:
             logger.error(f"Error in analyze_user_query: {e}")
         
         return {"key_points": [], "related_topics": [], "keywords": []}
-    
-    def hybrid_search(self, query_embedding: List[float], keywords: List[str], vector_db, n_results: int = 5) -> List[Dict[str, Any]]:
-        #logger.debug(f"Performing hybrid search with query embedding length: {len(query_embedding)} and keywords: {keywords}")
-        
-        # Perform semantic search
+
+    async def aanalyze_user_query(self, query: str) -> Dict[str, Any]:
         try:
-            semantic_results = vector_db.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results * 2,
-                include=["documents", "metadatas", "distances"]
-            )
-            #logger.debug("Semantic search successful")
+            return self._extract_json(await self.acall_api(self._analysis_messages(query)))
+        except Exception as e:
+            logger.error(f"Error in aanalyze_user_query: {e}")
+
+        return {"key_points": [], "related_topics": [], "keywords": []}
+
+    @staticmethod
+    def _semantic_query(vector_db, query_embeddings: List[List[float]], n_candidates: int, include_embeddings: bool = False,
+                        where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        try:
+            # All query vectors go out in one call; per-query hits are merged by best distance
+            return merge_query_results(vector_db.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_candidates,
+                where=where,
+                include=include
+            ))
         except Exception as e:
             logger.error(f"Semantic search failed with error: {str(e)}")
-            semantic_results = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
 
-        # Perform keyword search
+    @staticmethod
+    def _keyword_query(vector_db, keywords: List[str], n_candidates: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not keywords:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
         try:
-            keyword_query = " OR ".join(keywords)
-            keyword_results = vector_db.collection.query(
-                query_texts=[keyword_query],
-                n_results=n_results * 2,
-                include=["documents", "metadatas", "distances"]
-            )
-            #logger.debug("Keyword search successful")
+            # Lexical BM25 match, so exact CVE ids, malware names and versions are found
+            return vector_db.keyword_search(" ".join(keywords), n_candidates, where=where)
         except Exception as e:
             logger.error(f"Keyword search failed with error: {str(e)}")
-            keyword_results = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
-
-        # Combine and re-rank results
-        combined_results = []
-        seen_ids = set()
-
-        for sem_idx, key_idx in zip(range(len(semantic_results['ids'][0])), range(len(keyword_results['ids'][0]))):
-            if sem_idx < len(semantic_results['ids'][0]):
-                sem_id = semantic_results['ids'][0][sem_idx]
-                if sem_id not in seen_ids:
-                    seen_ids.add(sem_id)
-                    try:
-                        document = json.loads(semantic_results['documents'][0][sem_idx])
-                    except json.JSONDecodeError:
-                        document = semantic_results['documents'][0][sem_idx]
-                    combined_results.append({
-                        'id': sem_id,
-                        'document': document,
-                        'metadata': semantic_results['metadatas'][0][sem_idx],
-                        'score': 0.7 * (1 - semantic_results['distances'][0][sem_idx])
-                    })
-
-            if key_idx < len(keyword_results['ids'][0]):
-                key_id = keyword_results['ids'][0][key_idx]
-                if key_id not in seen_ids:
-                    seen_ids.add(key_id)
-                    try:
-                        document = json.loads(keyword_results['documents'][0][key_idx])
-                    except json.JSONDecodeError:
-                        document = keyword_results['documents'][0][key_idx]
-                    combined_results.append({
-                        'id': key_id,
-                        'document': document,
-                        'metadata': keyword_results['metadatas'][0][key_idx],
-                        'score': 0.3 * (1 - keyword_results['distances'][0][key_idx])
-                    })
-
-        # Sort by score and return top n_results
-        combined_results.sort(key=lambda x: x['score'], reverse=True)
-        return combined_results[:n_results]
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+    @staticmethod
+    def _candidate_embeddings(vector_db, semantic_results: Dict[str, Any], keyword_results: Dict[str, Any]) -> Dict[str, List[float]]:
+        """Embeddings of every candidate for MMR; keyword-only hits are fetched in one get()."""
+        embeddings = {}
+        if semantic_results.get('embeddings') is not None:
+            embeddings = dict(zip(semantic_results['ids'][0], semantic_results['embeddings'][0]))
+        missing = [doc_id for doc_id in keyword_results['ids'][0] if doc_id not in embeddings]
+        if missing:
+            try:
+                stored = vector_db.collection.get(ids=missing, include=['embeddings'])
+                embeddings.update(zip(stored['ids'], stored['embeddings']))
+            except Exception as e:
+                logger.error(f"Fetching candidate embeddings failed with error: {str(e)}")
+        return embeddings
+
+    @staticmethod
+    def _n_candidates(n_results: int) -> int:
+        return max(n_results * 2, RETRIEVAL_CANDIDATES)
+
+    @staticmethod
+    def _multi_query_texts(query: str, analysis: Dict[str, Any]) -> List[str]:
+        key_points = [point for point in (analysis or {}).get('key_points', []) if isinstance(point, str) and point.strip()]
+        return [query] + key_points[:MULTI_QUERY_KEY_POINTS]
+
+    def embed_queries(self, query: str, analysis: Dict[str, Any]) -> List[List[float]]:
+        """Embed the query and the analysis key points in one batched request (the query is usually cached)."""
+        return self.embed_documents(self._multi_query_texts(query, analysis), model=QUERY_EMBEDDING_MODEL)
+
+    async def aembed_queries(self, query: str, analysis: Dict[str, Any]) -> List[List[float]]:
+        return await self.aembed_documents(self._multi_query_texts(query, analysis), model=QUERY_EMBEDDING_MODEL)
+
+    def hybrid_search(self, query_embedding: List[float], keywords: List[str], vector_db, n_results: int = 5,
+                      extra_query_embeddings: Optional[List[List[float]]] = None, time_window_days: Optional[int] = TIME_WINDOW_DAYS) -> List[Dict[str, Any]]:
+        #logger.debug(f"Performing hybrid search with query embedding length: {len(query_embedding)} and keywords: {keywords}")
+        vector_db.refresh()
+        n_candidates = self._n_candidates(n_results)
+        query_embeddings = [query_embedding] + list(extra_query_embeddings or [])
+        where = vector_db.time_window_filter(time_window_days)
+        semantic_results = self._semantic_query(vector_db, query_embeddings, n_candidates, MMR_LAMBDA is not None, where)
+        keyword_results = self._keyword_query(vector_db, keywords, n_candidates, where)
+        return self._combine_results(vector_db, semantic_results, keyword_results, n_results)
+
+    async def ahybrid_search(self, query_embedding: List[float], keywords: List[str], vector_db, n_results: int = 5,
+                             extra_query_embeddings: Optional[List[List[float]]] = None, time_window_days: Optional[int] = TIME_WINDOW_DAYS) -> List[Dict[str, Any]]:
+        # Chroma has no async API; both queries go to the executor and run side by side
+        await self.run_sync(vector_db.refresh)
+        n_candidates = self._n_candidates(n_results)
+        query_embeddings = [query_embedding] + list(extra_query_embeddings or [])
+        where = vector_db.time_window_filter(time_window_days)
+        semantic_results, keyword_results = await asyncio.gather(
+            self.run_sync(self._semantic_query, vector_db, query_embeddings, n_candidates, MMR_LAMBDA is not None, where),
+            self.run_sync(self._keyword_query, vector_db, keywords, n_candidates, where)
+        )
+        return await self.run_sync(self._combine_results, vector_db, semantic_results, keyword_results, n_results)
+
+    def _combine_results(self, vector_db, semantic_results: Dict[str, Any], keyword_results: Dict[str, Any], n_results: int) -> List[Dict[str, Any]]:
+        # Fuse both candidate lists, collapse near-duplicate clusters, then optionally diversify with MMR
+        embeddings = None
+        if MMR_LAMBDA is not None:
+            embeddings = self._candidate_embeddings(vector_db, semantic_results, keyword_results)
+        near_duplicates = getattr(vector_db, 'near_duplicates', None)
+        clusters = None
+        if near_duplicates is not None:
+            candidate_ids = set(semantic_results['ids'][0]) | set(keyword_results['ids'][0])
+            clusters = {doc_id: near_duplicates.canonical_of(doc_id) for doc_id in candidate_ids}
+        results = rerank(
+            [semantic_results, keyword_results],
+            n_results,
+            method=FUSION_METHOD,
+            weights=FUSION_WEIGHTS.get(FUSION_METHOD),
+            mmr_lambda=MMR_LAMBDA,
+            embeddings=embeddings,
+            decay_half_life_days=DECAY_HALF_LIFE_DAYS,
+            clusters=clusters
+        )
+        if near_duplicates is not None:
+            # Other outlets reporting the same story travel with it as compact references
+            for result in results:
+                alternates = near_duplicates.alternates(result['id'])
+                if alternates:
+                    result['alternates'] = alternates
+        return results
     
-    def generate_response(self, query: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @staticmethod
+    def _generation_messages(query: str, search_results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         context = "\n".join([f"Story {i+1}: {json.dumps(result)}" for i, result in enumerate(search_results)])
         
-        messages = [
+        return [
             {"role": "system", "content": "You are an intelligent AI assistant named Wolfare specialized in answering questions about Cyber Security."},
             {"role": "user", "content": 
              f"""Wolfare can answer the following query based on the provided Cyber Security news, trends, manual, techniques, vulnerabilities and information.. Focus on extracting and presenting specific information from the news and various sources.
@@ -187,29 +487,58 @@ class SolarHackerNews:
              """
             }
         ]
+
+    def generate_response(self, query: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         try:
-            result = self.call_api(messages)
-            if "choices" in result and len(result["choices"]) > 0:
-                content = result["choices"][0]["message"]["content"]
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    json_str = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', json_str)
-                    response_dict = json.loads(json_str)
-                    return response_dict
-                else:
-                    logger.error("No JSON object found in the response")
-            else:
-                logger.error("Unexpected API response structure")
+            result = self.call_api(self._generation_messages(query, search_results))
+            return self._extract_json(result, strip_control_chars=True)
         except Exception as e:
             logger.error(f"Error in generate_response: {e}")
         
         return {
-            "answer": "Sorry, I couldn't generate a response due to an error.",
+            "answer": GENERATION_FAILED_ANSWER,
             "references": [],
             "confidence": 0.0
         }
-    
+
+    async def astream_generate_response(self, query: str, search_results: List[Dict[str, Any]]) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream generation: yields ("token", text) for every decoded piece of the "answer" field,
+        then a single ("response", dict) with the fully parsed JSON once the completion ends.
+        A failure before the first token yields the fallback response; after it, the error is
+        raised, since part of the answer has already been shown.
+        """
+        answer_stream = JSONFieldStream("answer")
+        streamed = False
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model="solar-1-mini-chat",
+                messages=self._generation_messages(query, search_results),
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                text = answer_stream.feed(delta)
+                if text:
+                    streamed = True
+                    yield "token", text
+
+            result = {"choices": [{"message": {"content": answer_stream.content}}]}
+            yield "response", self._extract_json(result, strip_control_chars=True)
+            return
+        except Exception as e:
+            logger.error(f"Error in astream_generate_response: {e}")
+            if streamed:
+                raise
+
+        yield "response", {
+            "answer": GENERATION_FAILED_ANSWER,
+            "references": [],
+            "confidence": 0.0
+        }
+
     def check_groundedness(self, context: str, response: str) -> Dict[str, Any]:
         try:
             completion = self.client.chat.completions.create(
@@ -229,10 +558,30 @@ class SolarHackerNews:
             logger.error(f"Error in groundedness check: {e}")
             return {"score": 0.0, "feedback": "Error in groundedness check"}
 
-    def self_evaluate(self, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def acheck_groundedness(self, context: str, response: str) -> Dict[str, Any]:
+        try:
+            completion = await self.async_client.chat.completions.create(
+                model="solar-1-mini-groundedness-check",
+                messages=[
+                    {"role": "user", "content": context},
+                    {"role": "assistant", "content": response}
+                ]
+            )
+
+            result = json.loads(completion.choices[0].message.content)
+            return {
+                "score": result.get("score", 0.0),
+                "feedback": result.get("feedback", "")
+            }
+        except Exception as e:
+            logger.error(f"Error in async groundedness check: {e}")
+            return {"score": 0.0, "feedback": "Error in groundedness check"}
+
+    @staticmethod
+    def _evaluation_messages(query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         context = "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
         
-        messages = [
+        return [
             {"role": "system", "content": "You are an AI assistant specialized in evaluating responses to cyber security-related queries."},
             {"role": "user", "content": 
              f"""Evaluate the following response to the user query. Consider the relevance, accuracy, and completeness of the answer based on the provided context.
@@ -255,7 +604,17 @@ class SolarHackerNews:
              """
             }
         ]
-        result = self.call_api(messages)
+
+    def self_evaluate(self, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        result = self.call_api(self._evaluation_messages(query, response, search_results))
+        return self._parse_evaluation(result)
+
+    async def aself_evaluate(self, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        result = await self.acall_api(self._evaluation_messages(query, response, search_results))
+        return self._parse_evaluation(result)
+
+    @staticmethod
+    def _parse_evaluation(result: Dict[str, Any]) -> Dict[str, Any]:
         if "choices" in result and len(result["choices"]) > 0:
             content = result["choices"][0]["message"]["content"]
             
@@ -282,151 +641,424 @@ class SolarHackerNews:
         return {"evaluation_score": 0.0, "feedback": "Unable to evaluate", "suggestions_for_improvement": []}
     
     
-    def create_rag_graph(self):
+    @staticmethod
+    def _grounding_context(search_results: List[Dict[str, Any]]) -> str:
+        return "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
+
+    def create_rag_graph(self, profile: str = "audited"):
+        def node(name, step, astep):
+            # Each node gets a sync and an async body so the same graph serves invoke() and ainvoke().
+            # Nodes return only the keys they produce; parallel branches never write the same key.
+            def run(state):
+                try:
+                    update = step(state)
+                    logger.debug(f"{name} output: {update}")
+                    return update
+                except Exception as e:
+                    logger.error(f"Error in {name}: {e}")
+                    return {'error': str(e)}
+
+            async def arun(state):
+                try:
+                    update = await astep(state)
+                    logger.debug(f"{name} output: {update}")
+                    return update
+                except Exception as e:
+                    logger.error(f"Error in {name}: {e}")
+                    return {'error': str(e)}
+
+            return RunnableLambda(run, afunc=arun, name=name)
+
+        def analysis_inputs(state):
+            query = state.get('query')
+            if not query:
+                raise ValueError("Query is missing from the state")
+            return query
+
+        def retriever_inputs(state):
+            query = state.get('query')
+            vector_db = state.get('vector_db')
+            query_embedding = state.get('query_embedding')
+            if not query or not vector_db:
+                raise ValueError("Query or vector_db is missing from the state")
+            if query_embedding is None:
+                raise ValueError("Query embedding is missing from the state")
+            # The raw query joins the keywords so exact identifiers in it always reach BM25
+            analysis = state.get('analysis') or {}
+            keywords = analysis.get('keywords', []) + [query]
+            return query, analysis, query_embedding, keywords, vector_db
+
+        def grounding_context(state):
+            return self._grounding_context(state.get('search_results') or [])
+
+        # The analysis and the embedding may already be in the initial state when they were
+        # computed alongside a cache lookup
         def query_analyzer(state):
-            #logger.debug(f"Query analyzer input state: {state}")
-            try:
-                query = state.get('query')
-                if not query:
-                    raise ValueError("Query is missing from the state")
-                analysis = self.analyze_user_query(query)
-                state['analysis'] = analysis
-                logger.debug(f"Query analyzer output state: {state}")
-                return state
-            except Exception as e:
-                logger.error(f"Error in query_analyzer: {e}")
-                state['error'] = str(e)
-                return state
+            if state.get('analysis') is not None:
+                return {}
+            return {'analysis': self.analyze_user_query(analysis_inputs(state))}
+
+        async def aquery_analyzer(state):
+            if state.get('analysis') is not None:
+                return {}
+            return {'analysis': await self.aanalyze_user_query(analysis_inputs(state))}
+
+        def query_embedder(state):
+            if state.get('query_embedding') is not None:
+                return {}
+            return {'query_embedding': self.embed_query(analysis_inputs(state))}
+
+        async def aquery_embedder(state):
+            if state.get('query_embedding') is not None:
+                return {}
+            return {'query_embedding': await self.aembed_query(analysis_inputs(state))}
 
+        # With analysis key points available, they are searched as extra query vectors
         def retriever(state):
-            #logger.debug(f"Retriever input state: {state}")
-            try:
-                query = state.get('query')
-                analysis = state.get('analysis', {})
-                vector_db = state.get('vector_db')
-                if not query or not vector_db:
-                    raise ValueError("Query or vector_db is missing from the state")
-                query_embedding = self.embed_query(query)
-                keywords = analysis.get('keywords', [])
-                search_results = self.hybrid_search(query_embedding, keywords, vector_db)
-                state['search_results'] = search_results
-                logger.debug(f"Retriever output state: {state}")
-                return state
-            except Exception as e:
-                logger.error(f"Error in retriever: {e}")
-                state['error'] = str(e)
-                return state
+            query, analysis, query_embedding, keywords, vector_db = retriever_inputs(state)
+            extra_embeddings = self.embed_queries(query, analysis)[1:] if analysis.get('key_points') else None
+            return {'search_results': self.hybrid_search(
+                query_embedding, keywords, vector_db,
+                extra_query_embeddings=extra_embeddings, time_window_days=state.get('time_window_days', TIME_WINDOW_DAYS)
+            )}
+
+        async def aretriever(state):
+            query, analysis, query_embedding, keywords, vector_db = retriever_inputs(state)
+            extra_embeddings = (await self.aembed_queries(query, analysis))[1:] if analysis.get('key_points') else None
+            return {'search_results': await self.ahybrid_search(
+                query_embedding, keywords, vector_db,
+                extra_query_embeddings=extra_embeddings, time_window_days=state.get('time_window_days', TIME_WINDOW_DAYS)
+            )}
 
         def generator(state):
-            #logger.debug(f"Generator input state: {state}")
-            try:
-                query = state.get('query')
-                search_results = state.get('search_results', [])
-                if not query:
-                    raise ValueError("Query is missing from the state")
-                response = self.generate_response(query, search_results)
-                state['response'] = response
-                logger.debug(f"Generator output state: {state}")
-                return state
-            except Exception as e:
-                logger.error(f"Error in generator: {e}")
-                state['error'] = str(e)
-                return state
+            query = analysis_inputs(state)
+            return {'response': self.generate_response(query, state.get('search_results') or [])}
+
+        # Answer tokens go to the graph's custom stream as they are generated, so astream_query can
+        # forward them; under ainvoke() the writer discards them
+        async def agenerator(state):
+            query = analysis_inputs(state)
+            write = get_stream_writer()
+            response = None
+            async for kind, payload in self.astream_generate_response(query, state.get('search_results') or []):
+                if kind == "token":
+                    write({"token": payload})
+                else:
+                    response = payload
+            return {'response': response}
 
         def hallucination_checker(state):
-            #logger.debug(f"Groundedness checker input state: {state}")
-            try:
-                query = state.get('query')
-                response = state.get('response', {})
-                search_results = state.get('search_results', [])
-                context = "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
-                groundedness = self.check_groundedness(context, response.get('answer', ''))
-                state['groundedness'] = groundedness
-                logger.debug(f"Groundedness checker output state: {state}")
-                return state
-            except Exception as e:
-                logger.error(f"Error in groundedness_checker: {e}")
-                state['error'] = str(e)
-                return state
+            answer = (state.get('response') or {}).get('answer', '')
+            return {'groundedness': self.check_groundedness(grounding_context(state), answer)}
+
+        async def ahallucination_checker(state):
+            answer = (state.get('response') or {}).get('answer', '')
+            return {'groundedness': await self.acheck_groundedness(grounding_context(state), answer)}
 
         def evaluator(state):
-            #logger.debug(f"Evaluator input state: {state}")
-            try:
-                query = state.get('query')
-                response = state.get('response', {})
-                search_results = state.get('search_results', [])
-                evaluation = self.self_evaluate(query, response, search_results)
-                state['evaluation'] = evaluation
-                logger.debug(f"Evaluator output state: {state}")
-                return state
-            except Exception as e:
-                logger.error(f"Error in evaluator: {e}")
-                state['error'] = str(e)
-                return state
-
-        workflow = Graph()
-        workflow.add_node("query_analyzer", query_analyzer)
-        workflow.add_node("retriever", retriever)
-        workflow.add_node("generator", generator)
-        workflow.add_node("groundedness_checker", hallucination_checker)
-        workflow.add_node("evaluator", evaluator)
-
-        workflow.set_entry_point("query_analyzer")
-        workflow.add_edge("query_analyzer", "retriever")
+            return {'evaluation': self.self_evaluate(state.get('query'), state.get('response') or {}, state.get('search_results') or [])}
+
+        async def aevaluator(state):
+            return {'evaluation': await self.aself_evaluate(state.get('query'), state.get('response') or {}, state.get('search_results') or [])}
+
+        if profile not in PIPELINE_PROFILES:
+            raise ValueError(f"Unknown pipeline profile: {profile}")
+
+        workflow = StateGraph(RAGState)
+        workflow.add_node("query_embedder", node("query_embedder", query_embedder, aquery_embedder))
+        workflow.add_node("retriever", node("retriever", retriever, aretriever))
+        workflow.add_node("generator", node("generator", generator, agenerator))
+
+        # Analysis and query embedding are independent, so they fan out from the start and
+        # the retriever waits for both. The fast profile skips analysis altogether.
+        workflow.add_edge(START, "query_embedder")
+        if profile == "fast":
+            workflow.add_edge("query_embedder", "retriever")
+        else:
+            workflow.add_node("query_analyzer", node("query_analyzer", query_analyzer, aquery_analyzer))
+            workflow.add_edge(START, "query_analyzer")
+            workflow.add_edge(["query_analyzer", "query_embedder"], "retriever")
         workflow.add_edge("retriever", "generator")
-        workflow.add_edge("generator", "groundedness_checker")
-        workflow.add_edge("groundedness_checker", "evaluator")
-        workflow.add_edge("evaluator", END)
+
+        # Groundedness and evaluation only need the generator output and run side by side.
+        # Only the audited profile waits for them; balanced schedules them after answering.
+        if profile == "audited":
+            workflow.add_node("groundedness_checker", node("groundedness_checker", hallucination_checker, ahallucination_checker))
+            workflow.add_node("evaluator", node("evaluator", evaluator, aevaluator))
+            workflow.add_edge("generator", "groundedness_checker")
+            workflow.add_edge("generator", "evaluator")
+            workflow.add_edge("groundedness_checker", END)
+            workflow.add_edge("evaluator", END)
+        else:
+            workflow.add_edge("generator", END)
 
         return workflow.compile()
 
-    def process_query(self, query: str, vector_db) -> Dict[str, Any]:
+    @staticmethod
+    def _scores(groundedness: Dict[str, Any], evaluation: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "groundedness_score": groundedness['score'],
+            "groundedness_feedback": groundedness['feedback'],
+            "evaluation_score": evaluation['evaluation_score'],
+            "evaluation_feedback": evaluation['feedback'],
+            "suggestions_for_improvement": evaluation['suggestions_for_improvement']
+        }
+
+    def _store_evaluation(self, request_id: str, record: Dict[str, Any]):
+        with self._evaluations_lock:
+            self.evaluations[request_id] = record
+            self.evaluations.move_to_end(request_id)
+            while len(self.evaluations) > self.max_stored_evaluations:
+                self.evaluations.popitem(last=False)
+
+    def get_evaluation(self, request_id: str) -> Dict[str, Any]:
+        """Return the deferred scores of a balanced query, or None for an unknown request id."""
+        with self._evaluations_lock:
+            return self.evaluations.get(request_id)
+
+    def _score_deferred(self, request_id: str, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]):
         try:
-            initial_state = {
-                "query": query,
-                "vector_db": vector_db,
-            }
-            logger.debug(f"Initial state: {initial_state}")
+            groundedness = self.check_groundedness(self._grounding_context(search_results), response.get('answer', ''))
+            evaluation = self.self_evaluate(query, response, search_results)
+            self._store_evaluation(request_id, {"status": "done", **self._scores(groundedness, evaluation)})
+        except Exception as e:
+            logger.error(f"Error in deferred scoring of {request_id}: {e}")
+            self._store_evaluation(request_id, {"status": "error", "error": str(e)})
 
-            final_state = self.graph.invoke(initial_state)
-            logger.debug(f"Final state: {final_state}")
+    async def _ascore_deferred(self, request_id: str, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]):
+        try:
+            groundedness, evaluation = await asyncio.gather(
+                self.acheck_groundedness(self._grounding_context(search_results), response.get('answer', '')),
+                self.aself_evaluate(query, response, search_results)
+            )
+            self._store_evaluation(request_id, {"status": "done", **self._scores(groundedness, evaluation)})
+        except Exception as e:
+            logger.error(f"Error in deferred scoring of {request_id}: {e}")
+            self._store_evaluation(request_id, {"status": "error", "error": str(e)})
 
-            if 'response' in final_state and 'groundedness' in final_state and 'evaluation' in final_state:
-                result = final_state['response']
-                result.update({
-                    "groundedness_score": final_state['groundedness']['score'],
-                    "groundedness_feedback": final_state['groundedness']['feedback'],
-                    "evaluation_score": final_state['evaluation']['evaluation_score'],
-                    "evaluation_feedback": final_state['evaluation']['feedback'],
-                    "suggestions_for_improvement": final_state['evaluation']['suggestions_for_improvement']
-                })
-                return result
-            elif 'error' in final_state:
-                return {
-                    "answer": f"An error occurred: {final_state['error']}",
-                    "references": [],
-                    "confidence": 0.0,
-                    "groundedness_score": 0.0,
-                    "evaluation_score": 0.0
-                }
-
-            logger.error("Graph execution completed without producing a complete result")
+    def schedule_scoring(self, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> str:
+        """Queue groundedness/evaluation for an answer that was already returned; returns its request id."""
+        request_id = str(uuid.uuid4())
+        self._store_evaluation(request_id, {"status": "pending"})
+        try:
+            task = asyncio.get_running_loop().create_task(
+                self._ascore_deferred(request_id, query, dict(response), search_results)
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        except RuntimeError:
+            # No running event loop (sync callers): score on the worker pool instead
+            self.executor.submit(self._score_deferred, request_id, query, dict(response), search_results)
+        return request_id
+
+    def _build_result(self, final_state: Dict[str, Any], profile: str = "audited") -> Dict[str, Any]:
+        if profile == "audited" and 'response' in final_state and 'groundedness' in final_state and 'evaluation' in final_state:
+            result = final_state['response']
+            result.update(self._scores(final_state['groundedness'], final_state['evaluation']))
+            return result
+        elif profile != "audited" and 'response' in final_state:
+            result = final_state['response']
+            if profile == "balanced":
+                result["request_id"] = self.schedule_scoring(
+                    final_state['query'], result, final_state.get('search_results') or []
+                )
+            return result
+        elif final_state.get('error'):
             return {
-                "answer": "Sorry, I couldn't generate a complete response due to an unknown error.",
+                "answer": f"An error occurred: {final_state['error']}",
                 "references": [],
                 "confidence": 0.0,
                 "groundedness_score": 0.0,
                 "evaluation_score": 0.0
             }
+
+        logger.error("Graph execution completed without producing a complete result")
+        return {
+            "answer": "Sorry, I couldn't generate a complete response due to an unknown error.",
+            "references": [],
+            "confidence": 0.0,
+            "groundedness_score": 0.0,
+            "evaluation_score": 0.0
+        }
+
+    @staticmethod
+    def _error_result(e: Exception) -> Dict[str, Any]:
+        return {
+            "answer": f"An error occurred while processing your query: {str(e)}",
+            "references": [],
+            "confidence": 0.0,
+            "groundedness_score": 0.0,
+            "evaluation_score": 0.0
+        }
+
+    @staticmethod
+    def _cache_key(profile: str, time_window_days: Optional[int]) -> str:
+        # Answers are only interchangeable between requests with the same profile and window
+        return f"{profile}|{time_window_days}"
+
+    def _cache_result(self, final_state: Dict[str, Any], cache_key: str, result: Dict[str, Any], version: Any):
+        # Only complete, error-free answers are worth serving again
+        if final_state.get('error') or final_state.get('query_embedding') is None:
+            return
+        if 'response' in final_state and final_state['response'].get('answer') != GENERATION_FAILED_ANSWER:
+            # The request id belongs to this request; hits get their own (see _from_cache)
+            entry = {
+                "result": {key: value for key, value in result.items() if key != "request_id"},
+                "search_results": final_state.get('search_results') or []
+            }
+            self.response_cache.put(final_state['query_embedding'], cache_key, entry, version)
+
+    def _from_cache(self, query: str, entry: Dict[str, Any], profile: str) -> Dict[str, Any]:
+        result = entry["result"]
+        if profile == "balanced":
+            result["request_id"] = self.schedule_scoring(query, result, entry["search_results"])
+        return result
+
+    def _prepare(self, query: str, vector_db, profile: str, time_window_days: Optional[int]) -> Tuple[Dict[str, Any], Any, Optional[Dict[str, Any]]]:
+        """
+        Initial graph state, the data version the cache was checked at and the cached result, if
+        any. The cache is checked before the query analysis runs: a running call to the worker
+        pool cannot be cancelled, so overlapping them would make every hit pay for the analysis.
+        """
+        initial_state = {
+            "query": query,
+            "vector_db": vector_db,
+            "time_window_days": time_window_days,
+        }
+        if not self.response_cache.enabled:
+            return initial_state, None, None
+        initial_state["query_embedding"] = self.embed_query(query)
+        version = vector_db.data_version()
+        cached = self.response_cache.get(initial_state["query_embedding"], self._cache_key(profile, time_window_days), version)
+        if cached is not None:
+            return initial_state, version, self._from_cache(query, cached, profile)
+        return initial_state, version, None
+
+    async def _aprepare(self, query: str, vector_db, profile: str, time_window_days: Optional[int]) -> Tuple[Dict[str, Any], Any, Optional[Dict[str, Any]]]:
+        """Async counterpart of _prepare; the analysis is a task that is cancelled on a hit."""
+        initial_state = {
+            "query": query,
+            "vector_db": vector_db,
+            "time_window_days": time_window_days,
+        }
+        if not self.response_cache.enabled:
+            return initial_state, None, None
+        analysis = asyncio.ensure_future(self.aanalyze_user_query(query)) if profile != "fast" else None
+        try:
+            initial_state["query_embedding"], version = await asyncio.gather(
+                self.aembed_query(query),
+                self.run_sync(vector_db.data_version)
+            )
+            cached = self.response_cache.get(initial_state["query_embedding"], self._cache_key(profile, time_window_days), version)
+            if cached is not None:
+                return initial_state, version, self._from_cache(query, cached, profile)
+            if analysis is not None:
+                initial_state["analysis"] = await analysis
+            return initial_state, version, None
+        finally:
+            if analysis is not None and not analysis.done():
+                analysis.cancel()
+
+    def process_query(self, query: str, vector_db, profile: str = DEFAULT_PROFILE, time_window_days: Optional[int] = TIME_WINDOW_DAYS) -> Dict[str, Any]:
+        try:
+            graph = self.graphs[profile]
+            initial_state, version, cached = self._prepare(query, vector_db, profile, time_window_days)
+            if cached is not None:
+                return cached
+            logger.debug(f"Initial state: {initial_state}")
+
+            final_state = graph.invoke(initial_state)
+            logger.debug(f"Final state: {final_state}")
+            result = self._build_result(final_state, profile)
+            self._cache_result(final_state, self._cache_key(profile, time_window_days), result, version)
+            return result
         except Exception as e:
             logger.error(f"Error in process_query: {e}")
-            return {
-                "answer": f"An error occurred while processing your query: {str(e)}",
-                "references": [],
-                "confidence": 0.0,
-                "groundedness_score": 0.0,
-                "evaluation_score": 0.0
+            return self._error_result(e)
+
+    async def aprocess_query(self, query: str, vector_db, profile: str = DEFAULT_PROFILE, time_window_days: Optional[int] = TIME_WINDOW_DAYS) -> Dict[str, Any]:
+        try:
+            graph = self.graphs[profile]
+            initial_state, version, cached = await self._aprepare(query, vector_db, profile, time_window_days)
+            if cached is not None:
+                return cached
+            logger.debug(f"Initial state: {initial_state}")
+
+            final_state = await graph.ainvoke(initial_state)
+            logger.debug(f"Final state: {final_state}")
+            result = self._build_result(final_state, profile)
+            self._cache_result(final_state, self._cache_key(profile, time_window_days), result, version)
+            return result
+        except Exception as e:
+            logger.error(f"Error in aprocess_query: {e}")
+            return self._error_result(e)
+
+    @staticmethod
+    def _update_events(update: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        # Trailing events, in the order the graph produces the values
+        update = update or {}
+        if 'response' in update:
+            yield {"event": "references", "data": {"references": update['response'].get("references", [])}}
+            yield {"event": "confidence", "data": {"confidence": update['response'].get("confidence", 0.0)}}
+        for key in ("groundedness", "evaluation"):
+            if key in update:
+                yield {"event": key, "data": update[key]}
+
+    @staticmethod
+    def _cached_update(cached: Dict[str, Any]) -> Dict[str, Any]:
+        # The graph values a cached result was built from (see _build_result and _scores)
+        update = {"response": {"references": cached.get("references", []), "confidence": cached.get("confidence", 0.0)}}
+        if "groundedness_score" in cached:
+            update["groundedness"] = {"score": cached["groundedness_score"], "feedback": cached.get("groundedness_feedback")}
+        if "evaluation_score" in cached:
+            update["evaluation"] = {
+                "evaluation_score": cached["evaluation_score"],
+                "feedback": cached.get("evaluation_feedback"),
+                "suggestions_for_improvement": cached.get("suggestions_for_improvement", [])
             }
-solar_hn = SolarHackerNews()
+        return update
+
+    async def astream_query(self, query: str, vector_db, profile: str = DEFAULT_PROFILE,
+                            time_window_days: Optional[int] = TIME_WINDOW_DAYS) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of aprocess_query that runs the same graph with graph.astream(). Yields
+        {"event", "data"} dicts: "token" events while the answer is generated, then "references",
+        "confidence", "groundedness" and "evaluation" as the nodes producing them finish, and
+        finally "done" with the merged result. The fast and balanced profiles emit no score
+        events; balanced carries a request_id. When no answer could be produced, for instance
+        because generation failed after tokens were sent, the last event is "error" instead.
+        """
+        try:
+            graph = self.graphs[profile]
+            cache_key = self._cache_key(profile, time_window_days)
+            initial_state, version, cached = await self._aprepare(query, vector_db, profile, time_window_days)
+            if cached is not None:
+                yield {"event": "token", "data": {"text": cached.get("answer", "")}}
+                for event in self._update_events(self._cached_update(cached)):
+                    yield event
+                yield {"event": "done", "data": cached}
+                return
+
+            final_state = initial_state
+            async for mode, chunk in graph.astream(initial_state, stream_mode=["custom", "updates", "values"]):
+                if mode == "custom":
+                    yield {"event": "token", "data": {"text": chunk["token"]}}
+                elif mode == "updates":
+                    for update in chunk.values():
+                        for event in self._update_events(update):
+                            yield event
+                else:
+                    final_state = chunk
+
+            result = self._build_result(final_state, profile)
+            if 'response' not in final_state:
+                yield {"event": "error", "data": result}
+                return
+            self._cache_result(final_state, cache_key, result, version)
+            yield {"event": "done", "data": result}
+        except Exception as e:
+            logger.error(f"Error in astream_query: {e}")
+            yield {"event": "error", "data": self._error_result(e)}
+
 
-    
\ No newline at end of file
+solar_hn = SolarHackerNews() if not is_worker_bootstrap() else None
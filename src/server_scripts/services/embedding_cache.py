@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, SHA-256 of the text).
+
+    Lookups go to an in-memory LRU first and then to a SQLite file holding the vectors as
+    float32 blobs, so embeddings survive restarts and re-ingesting known text costs no API call.
+    Pass path=None for a memory-only cache. The memory and disk tiers are also exposed
+    separately (get_memory/get_stored, put_memory/put_stored) and have their own locks, so
+    async callers can answer from memory on the event loop and hand only the SQLite work to a
+    thread.
+    """
+
+    def __init__(self, path: Optional[str], max_memory_entries: int = 10000):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # memory tier and counters
+        self._disk_lock = threading.Lock()  # the SQLite connection
+        self.connection = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, digest))"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _pack(embedding: Sequence[float]) -> bytes:
+        return array('f', embedding).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[float]:
+        vector = array('f')
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    @property
+    def persistent(self) -> bool:
+        return self.connection is not None
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings in input order, None where the text has not been embedded."""
+        results = self.get_memory(model, texts)
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self.get_stored(model, [texts[i] for i in missing])):
+                results[i] = embedding
+        return results
+
+    def get_memory(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Memory tier only; never touches the disk, so it is safe to call on an event loop."""
+        results = []
+        with self._lock:
+            for text in texts:
+                key = (model, self.digest(text))
+                embedding = self.memory.get(key)
+                if embedding is not None:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                results.append(embedding)
+        return results
+
+    def get_stored(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """SQLite tier for texts not found in memory; found vectors are promoted to memory."""
+        missing = {}
+        for i, text in enumerate(texts):
+            missing.setdefault(self.digest(text), []).append(i)
+        results = [None] * len(texts)
+        found = {}
+        if self.connection is not None:
+            digests = list(missing)
+            with self._disk_lock:
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(digests), 500):
+                    batch = digests[start:start + 500]
+                    rows = self.connection.execute(
+                        f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({','.join('?' * len(batch))})",
+                        [model, *batch]
+                    ).fetchall()
+                    found.update((digest, self._unpack(blob)) for digest, blob in rows)
+        with self._lock:
+            for digest, indices in missing.items():
+                embedding = found.get(digest)
+                if embedding is None:
+                    self.misses += len(indices)
+                    continue
+                self._remember((model, digest), embedding)
+                self.disk_hits += len(indices)
+                for i in indices:
+                    results[i] = embedding
+        return results
+
+    def put(self, model: str, text: str, embedding: Sequence[float]):
+        self.put_many(model, [text], [embedding])
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        self.put_memory(model, texts, embeddings)
+        self.put_stored(model, texts, embeddings)
+
+    def put_memory(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                self._remember((model, self.digest(text)), list(embedding))
+
+    def put_stored(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        if self.connection is None:
+            return
+        rows = [(model, self.digest(text), self._pack(embedding)) for text, embedding in zip(texts, embeddings)]
+        if not rows:
+            return
+        with self._disk_lock:
+            try:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, digest, vector) VALUES (?, ?, ?)", rows
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist embeddings: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stored = None
+        if self.connection is not None:
+            with self._disk_lock:
+                stored = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._lock:
+            return {
+                "memory_entries": len(self.memory),
+                "stored_entries": stored,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,154 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+logger = logging.getLogger(__name__)
+
+# Tree builder for news pages. lxml is faster but can build a different tree from the same
+# markup; run benchmarks/news_parser_benchmark.py on saved pages before switching to it
+HTML_PARSER = os.getenv("WOLFARE_NEWS_HTML_PARSER", "html.parser")
+
+
+class ElementsFilter(ElementFilter):
+    """
+    parse_only filter that builds only the top-level tags named in `names` or carrying one of
+    `classes`, with everything inside them. All other markup is skipped while parsing, so the
+    tree holds just the parts an extractor reads.
+    """
+
+    def __init__(self, names: Iterable[str] = (), classes: Iterable[str] = ()):
+        super().__init__()
+        self.names = frozenset(names)
+        self.classes = frozenset(classes)
+
+    @property
+    def includes_everything(self) -> bool:
+        return False
+
+    def allow_tag_creation(self, nsprefix: Optional[str], name: str, attrs) -> bool:
+        if name in self.names:
+            return True
+        value = (attrs or {}).get('class')
+        if not value:
+            return False
+        return not self.classes.isdisjoint(value.split() if isinstance(value, str) else value)
+
+    def allow_string_creation(self, string: str) -> bool:
+        return False
+
+
+# What each extractor reads; restricted=False parses whole pages (for comparison in benchmarks)
+THE_HACKER_NEWS_INDEX = ElementsFilter(classes=["body-post"])
+THE_HACKER_NEWS_ARTICLE = ElementsFilter(names=["p", "h2"], classes=["story-title", "author"])
+DARK_READING_INDEX = ElementsFilter(classes=["ContentPreview"])
+DARK_READING_ARTICLE = ElementsFilter(names=["p", "h2"], classes=["ArticleBase-LargeTitle"])
+SECURITY_AFFAIRS_INDEX = ElementsFilter(classes=["news-card"])
+SECURITY_AFFAIRS_ARTICLE = ElementsFilter(classes=["article-details-block", "post-time"])
+
+
+def parse(html: str, only: ElementsFilter, restricted: bool = True, parser: Optional[str] = None) -> BeautifulSoup:
+    return BeautifulSoup(html, parser or HTML_PARSER, parse_only=only if restricted else None)
+
+
+def thehackernews_links(html: str, restricted: bool = True, parser: Optional[str] = None) -> List[str]:
+    soup = parse(html, THE_HACKER_NEWS_INDEX, restricted, parser)
+    return [body_post.select_one('.story-link').get('href') for body_post in soup.find_all(class_="body-post clear")]
+
+
+def thehackernews_article(href: str, html: str, restricted: bool = True, parser: Optional[str] = None) -> Dict[str, Any]:
+    info = parse(html, THE_HACKER_NEWS_ARTICLE, restricted, parser)
+    header = info.select_one('.story-title')
+    content = info.find_all(['p', 'h2'])
+    content = content[:-8]
+    content = [element for element in content if not (element.name == 'p' and element.find('em'))]
+    content = "\n".join(["**" + i.text + "**" if i.name == 'h2' else i.text for i in content])
+    date = info.select_one('.author')
+    date = datetime.strptime(date.text, "%b %d, %Y").date()
+    return {
+        'Name': header.text,
+        'Content': content,
+        'Date': date,
+        'Ref': href,
+    }
+
+
+def darkreading_links(html: str, restricted: bool = True, parser: Optional[str] = None) -> List[str]:
+    soup = parse(html, DARK_READING_INDEX, restricted, parser)
+    elements = soup.find_all(class_='ContentPreview LatestFeatured-ContentItem LatestFeatured-ContentItem_left')
+    return ["https://www.darkreading.com" + body_post.select_one('.ListPreview-Title').get('href') for body_post in elements]
+
+
+def darkreading_article(href: str, html: str, restricted: bool = True, parser: Optional[str] = None) -> Dict[str, Any]:
+    def find_date_indices(text_list):
+        for index, text in enumerate(text_list):
+            try:
+                datetime.strptime(text, "%B %d, %Y")
+                return index
+            except ValueError:
+                continue
+        return None
+
+    def find_space_indices(text_list):
+        for index, text in enumerate(text_list):
+            if text == "**About the Author**" or text == "Read more about:":
+                return index
+        return None
+
+    info = parse(html, DARK_READING_ARTICLE, restricted, parser)
+    header = info.select_one('.ArticleBase-LargeTitle')
+    content = info.find_all(['p', 'h2'])
+    content = ["**" + i.text + "**" if i.name == 'h2' else i.text for i in content]
+    date_index = find_date_indices(content)
+    space_index = find_space_indices(content)
+    date = datetime.strptime(content[date_index], "%B %d, %Y").date()
+    content = content[date_index + 1:space_index]
+    return {
+        'Name': header.text,
+        'Content': "\n".join(content),
+        'Date': date,
+        'Ref': href,
+    }
+
+
+def securityaffairs_links(html: str, restricted: bool = True, parser: Optional[str] = None) -> List[str]:
+    soup = parse(html, SECURITY_AFFAIRS_INDEX, restricted, parser)
+    return [body_post.select_one('a').get('href') for body_post in soup.find_all(class_='news-card news-card-category mb-3 mb-lg-5')]
+
+
+def securityaffairs_article(href: str, html: str, restricted: bool = True, parser: Optional[str] = None) -> Dict[str, Any]:
+    def find_split_indices(text_list):
+        for index, text in enumerate(text_list):
+            if text.strip().replace('\u00A0', ' ') == "Follow me on Twitter: @securityaffairs and Facebook and Mastodon":
+                return index
+        return None
+
+    info = parse(html, SECURITY_AFFAIRS_ARTICLE, restricted, parser)
+    content = info.find('div', class_="article-details-block wow fadeInUp")
+    content = content.find_all(['p', 'h2'])
+    content = ["**" + i.text + "**" if i.name == 'h2' else i.text for i in content]
+    header = content[0]
+    split_index = find_split_indices(content)
+    content = content[1:split_index]
+    date = info.select(".post-time.mb-3")
+    date = date[0]
+    date = date.select('span')
+    date = date[1].text
+    date = datetime.strptime(date, " %B %d, %Y").date()
+    return {
+        'Name': header,
+        'Content': "\n".join(content),
+        'Date': date,
+        'Ref': href,
+    }
+
+
+# Source name -> (index URL, link extractor, article extractor)
+SOURCES = {
+    "thehackernews": ("https://thehackernews.com/", thehackernews_links, thehackernews_article),
+    "darkreading": ("https://www.darkreading.com/", darkreading_links, darkreading_article),
+    "securityaffairs": ("https://securityaffairs.com/category/cyber-crime", securityaffairs_links, securityaffairs_article),
+}
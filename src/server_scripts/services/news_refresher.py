@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NewsRefresher:
+    """
+    Keeps the latest news result fresh in a background thread (stale-while-revalidate).
+
+    `fetch` runs every `interval_seconds`; readers always get the last good result and its age
+    immediately through snapshot(). A failed refresh keeps the previous result and is retried
+    after `retry_seconds`. Refreshes are single-flight: refresh() returns False instead of
+    starting a second run while one is in progress.
+    """
+
+    def __init__(self, fetch: Callable[[], Any], interval_seconds: float = 3600, retry_seconds: float = 300):
+        self.fetch = fetch
+        self.interval_seconds = interval_seconds
+        self.retry_seconds = retry_seconds
+        self.result = None
+        self.updated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.refreshes = 0
+        self.failures = 0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refresh_lock.locked()
+
+    def refresh(self) -> bool:
+        """Run one refresh now; returns False without fetching when another one is running or it failed."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.monotonic()
+            result = self.fetch()
+            self.result, self.updated_at, self.last_error = result, time.time(), None
+            self.refreshes += 1
+            logger.info(f"News refreshed in {time.monotonic() - started:.1f}s")
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            self.failures += 1
+            logger.error(f"News refresh failed, keeping previous result: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.retry_seconds if self.last_error else self.interval_seconds)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="news-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        age = time.time() - self.updated_at if self.updated_at is not None else None
+        return {
+            "output": self.result,
+            "updated_at": datetime.fromtimestamp(self.updated_at).isoformat() if self.updated_at is not None else None,
+            "age_seconds": age,
+            "stale": age is None or age > 2 * self.interval_seconds,
+            "refreshing": self.refreshing,
+            "last_error": self.last_error
+        }
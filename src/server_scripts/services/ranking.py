@@ -0,0 +1,174 @@
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "score")
+
+
+def merge_query_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Collapse a multi-vector collection.query result (one row per query embedding) into a
+    single row, keeping each id once at its best distance and ordering by that distance.
+    """
+    rows = len(results['ids'])
+    if rows <= 1:
+        return results
+    has_embeddings = results.get('embeddings') is not None
+    best = {}
+    for row in range(rows):
+        for column, doc_id in enumerate(results['ids'][row]):
+            distance = results['distances'][row][column]
+            if doc_id not in best or distance < best[doc_id][0]:
+                best[doc_id] = (distance, row, column)
+    ranked = sorted(best.items(), key=lambda item: item[1][0])
+    merged = {key: [[results[key][row][column] for _, (_, row, column) in ranked]]
+              for key in ('ids', 'documents', 'metadatas', 'distances')}
+    if has_embeddings:
+        merged['embeddings'] = [[results['embeddings'][row][column] for _, (_, row, column) in ranked]]
+    return merged
+
+
+def _candidate_union(result_lists: Sequence[Dict[str, Any]]):
+    """Map every id across the result lists to one candidate slot, keeping first-seen payloads."""
+    positions, documents, metadatas = {}, [], []
+    for results in result_lists:
+        for doc_id, document, metadata in zip(results['ids'][0], results['documents'][0], results['metadatas'][0]):
+            if doc_id not in positions:
+                positions[doc_id] = len(positions)
+                documents.append(document)
+                metadatas.append(metadata)
+    return positions, documents, metadatas
+
+
+def _similarities(results: Dict[str, Any]) -> np.ndarray:
+    # Lists may carry raw scores (BM25, higher is better) or distances (lower is better)
+    if results.get('scores'):
+        return np.asarray(results['scores'][0], dtype=np.float64)
+    return -np.asarray(results['distances'][0], dtype=np.float64)
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    if values.size == 0:
+        return values
+    spread = values.max() - values.min()
+    if spread == 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def fuse(result_lists: Sequence[Dict[str, Any]], method: str = "rrf", weights: Optional[Sequence[float]] = None, rrf_k: int = 60):
+    """
+    Fuse collection.query-style result lists into one candidate set.
+
+    "rrf" is reciprocal rank fusion, sum of w / (rrf_k + rank), which needs no score calibration.
+    "score" min-max normalizes each list's similarities to [0, 1] and adds them weighted, so
+    distance scales that are not comparable (cosine vs L2 vs BM25) still combine sensibly.
+
+    :return: (ids, scores, documents, metadatas) with every id once, ordered best first
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}")
+    weights = weights or [1.0] * len(result_lists)
+    positions, documents, metadatas = _candidate_union(result_lists)
+    scores = np.zeros(len(positions), dtype=np.float64)
+    for results, weight in zip(result_lists, weights):
+        ids = results['ids'][0]
+        if not ids:
+            continue
+        slots = np.fromiter((positions[doc_id] for doc_id in ids), dtype=np.int64, count=len(ids))
+        if method == "rrf":
+            scores[slots] += weight / (rrf_k + np.arange(1, len(ids) + 1))
+        else:
+            scores[slots] += weight * _min_max(_similarities(results))
+
+    order = np.argsort(-scores, kind="stable")
+    ids = list(positions)
+    return [ids[i] for i in order], scores[order], [documents[i] for i in order], [metadatas[i] for i in order]
+
+
+def time_decay(metadatas: Sequence[Dict[str, Any]], half_life_days: float, now: Optional[float] = None) -> np.ndarray:
+    """
+    Exponential recency factor per candidate, 0.5 ** (age / half-life), from the unix "time"
+    metadata. Candidates without a timestamp (e.g. PDF chunks) are not decayed.
+    """
+    now = time.time() if now is None else now
+    timestamps = np.fromiter(
+        (float(metadata.get('time')) if metadata and isinstance(metadata.get('time'), (int, float)) else np.nan for metadata in metadatas),
+        dtype=np.float64, count=len(metadatas)
+    )
+    age_days = np.clip((now - timestamps) / 86400.0, 0, None)
+    return np.where(np.isnan(timestamps), 1.0, np.power(0.5, age_days / half_life_days))
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, embeddings: np.ndarray, top_k: int, diversity_lambda: float = 0.7) -> List[int]:
+    """
+    Greedy MMR selection: each pick maximizes lambda * relevance - (1 - lambda) * max similarity
+    to what was already picked. The pairwise cosine matrix is computed once with one matmul.
+
+    :return: indices into the candidate arrays, in selection order
+    """
+    count = len(relevance)
+    if count == 0:
+        return []
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+    similarity = unit @ unit.T
+    relevance = _min_max(np.asarray(relevance, dtype=np.float64))
+
+    selected = []
+    redundancy = np.full(count, -np.inf)
+    available = np.ones(count, dtype=bool)
+    for _ in range(min(top_k, count)):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        objective = diversity_lambda * relevance - (1 - diversity_lambda) * penalty
+        objective[~available] = -np.inf
+        best = int(np.argmax(objective))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def collapse_clusters(ids: Sequence[str], clusters: Dict[str, str]) -> List[int]:
+    """Indices of the first (best) candidate of every cluster; ids missing from `clusters` are their own cluster."""
+    seen, keep = set(), []
+    for i, doc_id in enumerate(ids):
+        cluster = clusters.get(doc_id, doc_id)
+        if cluster not in seen:
+            seen.add(cluster)
+            keep.append(i)
+    return keep
+
+
+def rerank(result_lists: Sequence[Dict[str, Any]], n_results: int, method: str = "rrf", weights: Optional[Sequence[float]] = None,
+           mmr_lambda: Optional[float] = None, embeddings: Optional[Dict[str, Sequence[float]]] = None,
+           decay_half_life_days: Optional[float] = None, clusters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fuse the result lists and return the top n_results as hybrid_search result dicts.
+    With decay_half_life_days the fused scores are multiplied by time_decay() and re-sorted.
+    With clusters (id -> cluster id) only the best candidate of each near-duplicate cluster is kept.
+    When mmr_lambda is set and embeddings (id -> vector) cover the candidates, the final
+    selection is diversified with MMR; candidates without an embedding are left out of it.
+    """
+    ids, scores, documents, metadatas = fuse(result_lists, method, weights)
+    if decay_half_life_days and ids:
+        scores = scores * time_decay(metadatas, decay_half_life_days)
+        order = np.argsort(-scores, kind="stable")
+        scores = scores[order]
+        ids, documents, metadatas = [ids[i] for i in order], [documents[i] for i in order], [metadatas[i] for i in order]
+    if clusters:
+        keep = collapse_clusters(ids, clusters)
+        scores = scores[keep]
+        ids, documents, metadatas = [ids[i] for i in keep], [documents[i] for i in keep], [metadatas[i] for i in keep]
+    order = list(range(min(n_results, len(ids))))
+    if mmr_lambda is not None and embeddings:
+        usable = [i for i, doc_id in enumerate(ids) if doc_id in embeddings]
+        if usable:
+            matrix = np.asarray([embeddings[ids[i]] for i in usable], dtype=np.float32)
+            picks = maximal_marginal_relevance(scores[usable], matrix, n_results, mmr_lambda)
+            order = [usable[i] for i in picks]
+    return [
+        {'id': ids[i], 'document': documents[i], 'metadata': metadatas[i], 'score': float(scores[i])}
+        for i in order
+    ]
@@ -0,0 +1,104 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """
+    LRU + TTL cache of pipeline results keyed by query embedding.
+
+    A lookup is a hit when a cached query of the same profile has cosine similarity of at
+    least `threshold` with the new query. Entries are dropped when they outlive `ttl_seconds`,
+    when the cache grows beyond `max_entries` (least recently used first), and all at once
+    when the data version passed to get() changes. The caller reads that version from the
+    store on every lookup, so writes made by other processes (ingestion scripts) also retire
+    the cached answers; results computed against an older version are not stored.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (profile, unit embedding, result, created_at)
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self.entries.items() if now - entry[3] > self.ttl_seconds]
+        for key in expired:
+            del self.entries[key]
+
+    def _check_version(self, version: Any):
+        if version is not None and version != self.version:
+            if self.entries:
+                self.entries.clear()
+                self.invalidations += 1
+            self.version = version
+
+    def get(self, embedding: List[float], profile: str, version: Any = None) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            self._evict_expired(time.monotonic())
+            candidates = [(key, entry[1]) for key, entry in self.entries.items() if entry[0] == profile]
+            if candidates:
+                similarities = np.stack([vector for _, vector in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = candidates[best][0]
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(self.entries[key][2])
+            self.misses += 1
+            return None
+
+    def put(self, embedding: List[float], profile: str, result: Dict[str, Any], version: Any = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self.entries[self._next_key] = (profile, self._normalize(embedding), copy.deepcopy(result), time.monotonic())
+            self._next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry."""
+        with self._lock:
+            self.entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds
+            }
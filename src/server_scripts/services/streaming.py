@@ -0,0 +1,71 @@
+import json
+import re
+from typing import Dict, Any
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JSONFieldStream:
+    """
+    Incrementally extract one string field from a JSON object that is still being streamed.
+
+    The model answers in JSON, so the "answer" text is only readable once its opening quote
+    has arrived. feed() takes raw completion deltas and returns whatever decoded characters of
+    the field became available, leaving incomplete escape sequences buffered for the next call.
+    """
+
+    def __init__(self, field: str = "answer"):
+        self.key_pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self.buffer = ""
+        self.position = None  # index of the next undecoded character inside the field value
+        self.finished = False
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        if self.finished:
+            return ""
+        if self.position is None:
+            match = self.key_pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        out = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.finished = True
+                i += 1
+                break
+            if char == '\\':
+                if i + 1 >= len(self.buffer):
+                    break
+                code = self.buffer[i + 1]
+                if code == 'u':
+                    if i + 6 > len(self.buffer):
+                        break
+                    try:
+                        out.append(chr(int(self.buffer[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+                continue
+            # Raw control characters are stripped the same way generate_response does
+            if ord(char) >= 0x20 and not 0x7F <= ord(char) <= 0x9F:
+                out.append(char)
+            i += 1
+        self.position = i
+        return "".join(out)
+
+    @property
+    def content(self) -> str:
+        return self.buffer
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Serialize one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,4 +1,15 @@
+import multiprocessing
+
 from dotenv import load_dotenv
 
 def load_environment_variables():
-    load_dotenv()
\ No newline at end of file
+    load_dotenv()
+
+def is_worker_bootstrap() -> bool:
+    """
+    True while a spawned worker process (the PDF extraction pool) re-imports the parent's
+    __main__ before running its task. Modules skip building their singletons then: the workers
+    only run database.pdf_ingest functions and would otherwise open Chroma and the Solar clients.
+    multiprocessing sets the same flag for its own "not importing main" check.
+    """
+    return getattr(multiprocessing.current_process(), "_inheriting", False)
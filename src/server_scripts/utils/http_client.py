@@ -0,0 +1,56 @@
+import logging
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; WolfareNewsBot/1.0)"}
+
+
+class PooledHTTPClient:
+    """
+    One requests.Session shared by all scraper threads.
+
+    Connections are kept alive and pooled per host, every request has a connect/read timeout,
+    idempotent requests are retried with exponential backoff on connection errors and
+    429/5xx responses (honouring Retry-After), and a semaphore per host caps how many
+    requests run against the same site at once.
+    """
+
+    def __init__(self, timeout: tuple = (5, 20), max_per_host: int = 4, retries: int = 3,
+                 backoff_factor: float = 0.5, pool_size: int = 16, headers: Optional[Dict[str, str]] = None):
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}), respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        self._hosts: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.max_per_host)
+            return self._hosts[host]
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        with self._host_slot(url):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        self.session.close()